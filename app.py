@@ -2,18 +2,37 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
+from plotly.subplots import make_subplots
+import numpy as np
+from datetime import date, datetime, timedelta
 from streamlit_option_menu import option_menu
-import base64
+import csv
+import hashlib
+import io
 import sqlite3
 import os
+import queue
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 
-# 下载CSV文件功能
-def get_csv_download_link(df, filename, text):
-    csv = df.to_csv(index=False)
-    b64 = base64.b64encode(csv.encode()).decode()
-    href = f'<a href="data:file/csv;base64,{b64}" download="{filename}">{text}</a>'
-    return href
+# Excel流式导出优先使用 xlsxwriter，未安装时退回 openpyxl 的只写模式
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+    import openpyxl
+
+# 本次运行的开始时间和各阶段结束时间，用于统计每次运行的固定开销
+RUN_STARTED = time.perf_counter()
+run_phases = []
+
+# 记录一个运行阶段的结束时间
+def mark_run_phase(name):
+    run_phases.append((name, time.perf_counter()))
 
 # 设置页面配置
 st.set_page_config(
@@ -24,7 +43,7 @@ st.set_page_config(
 )
 
 # 自定义CSS样式 - 现代化界面设计（增强版）
-st.markdown("""
+APP_CSS = """
 <style>
     /* 全局样式 */
     .main {
@@ -366,14 +385,121 @@ st.markdown("""
         }
     }
 </style>
-""", unsafe_allow_html=True)
+"""
 
-# 数据库初始化函数
-def init_db():
-    conn = sqlite3.connect('production_data.db')
-    cursor = conn.cursor()
-    # 创建生产数据表
-    cursor.execute('''
+# 压缩CSS（去掉注释和多余空白），每个进程只计算一次，减小每次运行发送的样式内容
+@st.cache_resource(show_spinner=False)
+def minified_css():
+    css = re.sub(r'/\*.*?\*/', '', APP_CSS, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    return re.sub(r':\s+', ':', css).strip()
+
+# 样式元素每次运行都必须重新输出，否则会从页面上移除
+st.markdown(minified_css(), unsafe_allow_html=True)
+mark_run_phase("页面配置与样式")
+
+# 数据库文件路径
+DB_PATH = 'production_data.db'
+
+# 数据库连接管理器：进程内共享，读连接放在连接池中复用，写操作经由唯一的写连接串行执行
+class DatabaseManager:
+    def __init__(self, path):
+        self.path = path
+        self._readers = queue.SimpleQueue()
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+        # WAL模式下读写互不阻塞，该设置会持久化到数据库文件中
+        self._writer.execute('PRAGMA journal_mode=WAL')
+    
+    def _connect(self):
+        # isolation_level=None：由我们显式控制事务；连接会在线程间传递，但同一时刻只被一个线程使用
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA cache_size=-65536')
+        conn.execute('PRAGMA mmap_size=268435456')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+    
+    # 借出一个读连接，用完归还到连接池
+    @contextmanager
+    def reader(self):
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+            conn.execute('PRAGMA query_only=ON')
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+    
+    # 获取写连接并开启写事务，正常退出时提交，出错时回滚
+    @contextmanager
+    def writer(self):
+        with self._write_lock:
+            conn = self._writer
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+# 获取进程内共享的数据库连接管理器
+@st.cache_resource
+def get_db():
+    return DatabaseManager(DB_PATH)
+
+# 不合格原因的分隔符：兼容英文逗号、中文逗号和顿号
+DEFECT_REASON_SEPARATOR = re.compile(r'[,，、]')
+
+# 将不合格原因字符串拆分为原因列表（去除空白和重复，"无"表示没有不合格原因）
+def split_defect_reasons(text):
+    if not text or text == '无':
+        return []
+    return list(dict.fromkeys(reason.strip() for reason in DEFECT_REASON_SEPARATOR.split(text) if reason.strip()))
+
+# 为一组记录写入不合格原因关联（在写事务中调用），links 为 (记录id, 原因名称) 列表
+def link_defect_reasons(conn, links):
+    links = list(links)
+    if not links:
+        return
+    conn.executemany('INSERT OR IGNORE INTO defect_reason (name) VALUES (?)', [(reason,) for reason in dict.fromkeys(reason for _, reason in links)])
+    conn.executemany('''
+        INSERT OR IGNORE INTO production_defect_reason (record_id, reason_id)
+        SELECT ?, id FROM defect_reason WHERE name = ?
+    ''', links)
+
+# 根据生产数据表中的不合格原因字符串补全原因关联（在写事务中调用）
+def backfill_defect_reasons(conn):
+    rows = conn.execute("SELECT id, unqualified_reason FROM production_data WHERE unqualified_reason IS NOT NULL AND unqualified_reason != '无'").fetchall()
+    link_defect_reasons(conn, [(record_id, reason) for record_id, text in rows for reason in split_defect_reasons(text)])
+
+# 根据原始数据重建每日、每月汇总表（在写事务中调用）
+def rebuild_rollup_tables(conn):
+    conn.execute('DELETE FROM daily_rollup')
+    conn.execute('DELETE FROM monthly_rollup')
+    conn.execute('''
+        INSERT INTO daily_rollup (date, product_name, production_quantity, qualified_quantity, unqualified_quantity, record_count)
+        SELECT date, product_name, SUM(production_quantity), SUM(qualified_quantity), SUM(unqualified_quantity), COUNT(*)
+        FROM production_data
+        GROUP BY date, product_name
+    ''')
+    conn.execute('''
+        INSERT INTO monthly_rollup (month, product_name, production_quantity, qualified_quantity, unqualified_quantity, record_count)
+        SELECT substr(date, 1, 7), product_name, SUM(production_quantity), SUM(qualified_quantity), SUM(unqualified_quantity), SUM(record_count)
+        FROM daily_rollup
+        GROUP BY substr(date, 1, 7), product_name
+    ''')
+
+# 数据库结构迁移：按版本顺序执行，当前版本记录在 PRAGMA user_version 中
+# 每个版本是一组SQL语句（或接收连接的函数），只追加新版本，不修改已发布的版本
+SCHEMA_MIGRATIONS = [
+    # 版本1：创建生产数据表
+    [
+        '''
         CREATE TABLE IF NOT EXISTS production_data (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             date TEXT NOT NULL,
@@ -384,16 +510,286 @@ def init_db():
             unqualified_reason TEXT,
             qualification_rate REAL NOT NULL
         )
-    ''')
-    conn.commit()
-    conn.close()
+        ''',
+    ],
+    # 版本2：按产品+日期、按日期筛选的索引
+    [
+        'CREATE INDEX IF NOT EXISTS idx_production_product_date ON production_data (product_name, date)',
+        'CREATE INDEX IF NOT EXISTS idx_production_date ON production_data (date)',
+    ],
+    # 版本3：每日×产品、每月×产品汇总表，由触发器在插入、删除时增量维护
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS daily_rollup (
+            date TEXT NOT NULL,
+            product_name TEXT NOT NULL,
+            production_quantity INTEGER NOT NULL,
+            qualified_quantity INTEGER NOT NULL,
+            unqualified_quantity INTEGER NOT NULL,
+            record_count INTEGER NOT NULL,
+            PRIMARY KEY (date, product_name)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS monthly_rollup (
+            month TEXT NOT NULL,
+            product_name TEXT NOT NULL,
+            production_quantity INTEGER NOT NULL,
+            qualified_quantity INTEGER NOT NULL,
+            unqualified_quantity INTEGER NOT NULL,
+            record_count INTEGER NOT NULL,
+            PRIMARY KEY (month, product_name)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_daily_rollup_product_date ON daily_rollup (product_name, date)',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_production_insert_rollup AFTER INSERT ON production_data
+        BEGIN
+            INSERT INTO daily_rollup (date, product_name, production_quantity, qualified_quantity, unqualified_quantity, record_count)
+            VALUES (NEW.date, NEW.product_name, NEW.production_quantity, NEW.qualified_quantity, NEW.unqualified_quantity, 1)
+            ON CONFLICT (date, product_name) DO UPDATE SET
+                production_quantity = production_quantity + excluded.production_quantity,
+                qualified_quantity = qualified_quantity + excluded.qualified_quantity,
+                unqualified_quantity = unqualified_quantity + excluded.unqualified_quantity,
+                record_count = record_count + 1;
+            INSERT INTO monthly_rollup (month, product_name, production_quantity, qualified_quantity, unqualified_quantity, record_count)
+            VALUES (substr(NEW.date, 1, 7), NEW.product_name, NEW.production_quantity, NEW.qualified_quantity, NEW.unqualified_quantity, 1)
+            ON CONFLICT (month, product_name) DO UPDATE SET
+                production_quantity = production_quantity + excluded.production_quantity,
+                qualified_quantity = qualified_quantity + excluded.qualified_quantity,
+                unqualified_quantity = unqualified_quantity + excluded.unqualified_quantity,
+                record_count = record_count + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_production_delete_rollup AFTER DELETE ON production_data
+        BEGIN
+            UPDATE daily_rollup SET
+                production_quantity = production_quantity - OLD.production_quantity,
+                qualified_quantity = qualified_quantity - OLD.qualified_quantity,
+                unqualified_quantity = unqualified_quantity - OLD.unqualified_quantity,
+                record_count = record_count - 1
+            WHERE date = OLD.date AND product_name = OLD.product_name;
+            DELETE FROM daily_rollup
+            WHERE date = OLD.date AND product_name = OLD.product_name AND record_count <= 0;
+            UPDATE monthly_rollup SET
+                production_quantity = production_quantity - OLD.production_quantity,
+                qualified_quantity = qualified_quantity - OLD.qualified_quantity,
+                unqualified_quantity = unqualified_quantity - OLD.unqualified_quantity,
+                record_count = record_count - 1
+            WHERE month = substr(OLD.date, 1, 7) AND product_name = OLD.product_name;
+            DELETE FROM monthly_rollup
+            WHERE month = substr(OLD.date, 1, 7) AND product_name = OLD.product_name AND record_count <= 0;
+        END
+        ''',
+        rebuild_rollup_tables,
+    ],
+    # 版本4：不合格原因字典表和记录-原因关联表，删除记录时由触发器清理关联
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS defect_reason (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS production_defect_reason (
+            record_id INTEGER NOT NULL,
+            reason_id INTEGER NOT NULL,
+            PRIMARY KEY (record_id, reason_id)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_production_defect_reason_reason ON production_defect_reason (reason_id, record_id)',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_production_delete_reason AFTER DELETE ON production_data
+        BEGIN
+            DELETE FROM production_defect_reason WHERE record_id = OLD.id;
+        END
+        ''',
+        backfill_defect_reasons,
+    ],
+    # 版本5：数据版本计数器，production_data 的任何写入都会使其递增，用于失效进程内共享缓存
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS app_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        "INSERT OR IGNORE INTO app_meta (key, value) VALUES ('data_version', 0)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_production_insert_version AFTER INSERT ON production_data
+        BEGIN
+            UPDATE app_meta SET value = value + 1 WHERE key = 'data_version';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_production_update_version AFTER UPDATE ON production_data
+        BEGIN
+            UPDATE app_meta SET value = value + 1 WHERE key = 'data_version';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_production_delete_version AFTER DELETE ON production_data
+        BEGIN
+            UPDATE app_meta SET value = value + 1 WHERE key = 'data_version';
+        END
+        ''',
+    ],
+]
 
-# 从数据库加载数据
-def load_data_from_db():
-    conn = sqlite3.connect('production_data.db')
-    df = pd.read_sql_query('SELECT * FROM production_data', conn)
-    conn.close()
+# 数据库初始化函数
+def init_db():
+    db = get_db()
+    # 已是最新版本时直接返回，不占用写锁
+    with db.reader() as conn:
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= len(SCHEMA_MIGRATIONS):
+            return
     
+    for version, steps in enumerate(SCHEMA_MIGRATIONS, start=1):
+        # 每个版本在独立的写事务中执行，多个进程同时启动时只有一个会真正执行迁移
+        with db.writer() as conn:
+            if conn.execute('PRAGMA user_version').fetchone()[0] < version:
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute(f'PRAGMA user_version = {version}')
+
+# 从数据库加载数据（按日期排序，日期范围筛选可以用二分查找）
+def load_data_from_db():
+    with get_db().reader() as conn:
+        df = pd.read_sql_query('SELECT * FROM production_data ORDER BY date, id', conn)
+    return format_production_frame(df)
+
+# 读取当前数据版本号
+def get_data_version():
+    with get_db().reader() as conn:
+        return conn.execute("SELECT value FROM app_meta WHERE key = 'data_version'").fetchone()[0]
+
+# 进程内共享的只读数据帧：所有会话共用同一份，数据版本变化时才重新加载
+@st.cache_resource(max_entries=1, show_spinner=False)
+def load_shared_production_data(data_version):
+    return load_data_from_db()
+
+# 获取共享数据帧及其数据版本和日历键，版本号只读取一次，按版本缓存派生结果时应使用这里返回的版本
+def get_production_snapshot():
+    data_version = get_data_version()
+    df = load_shared_production_data(data_version)
+    return data_version, df, load_shared_calendar_keys(data_version, df)
+
+# 获取共享数据帧（调用方不得原地修改）
+def get_production_data():
+    return get_production_snapshot()[1]
+
+# 由日期列计算单个整数日历键：年、年月(YYYYMM)、ISO周(YYYYWW)或季度(YYYYQ)，按周期筛选时只需整数比较
+def build_calendar_key(dates, name):
+    if name == '年':
+        key = dates.dt.year
+    elif name == '年月':
+        key = dates.dt.year * 100 + dates.dt.month
+    elif name == 'ISO周':
+        iso = dates.dt.isocalendar()
+        key = iso['year'] * 100 + iso['week']
+    else:
+        key = dates.dt.year * 10 + dates.dt.quarter
+    return key.astype('int32').rename(name)
+
+CALENDAR_KEY_COLUMNS = ['年', '年月', 'ISO周', '季度']
+
+# 一次性计算全部日历键，索引与日期列一致
+def build_calendar_keys(dates):
+    return pd.DataFrame({name: build_calendar_key(dates, name) for name in CALENDAR_KEY_COLUMNS}, index=dates.index)
+
+# 共享数据帧的日历键，按记录主键索引，与数据帧一起按数据版本缓存；调用方用 .loc[df.index, 键名] 只取需要的键
+@st.cache_resource(max_entries=1, show_spinner=False)
+def load_shared_calendar_keys(data_version, _df):
+    return build_calendar_keys(_df['日期'])
+
+# 向量化拆分不合格原因：一次 str.split + explode，分隔符与写入时一致（逗号、中文逗号、顿号），
+# 返回每条记录每个原因一行的 (记录, 产品名称, 日期, 不合格原因) 数据帧
+def explode_defect_reasons(df):
+    tokens = df['不合格原因'].astype(str).str.split(DEFECT_REASON_SEPARATOR.pattern, regex=True).explode().str.strip()
+    tokens = tokens[(tokens != '') & (tokens != '无')]
+    exploded = pd.DataFrame({
+        '记录': tokens.index.to_numpy(),
+        '产品名称': df['产品名称'].loc[tokens.index].to_numpy(),
+        '日期': df['日期'].loc[tokens.index].to_numpy(),
+        '不合格原因': tokens.to_numpy()
+    })
+    # 同一条记录中重复填写的原因只计一次
+    exploded = exploded.drop_duplicates(['记录', '不合格原因'], ignore_index=True)
+    exploded['不合格原因'] = exploded['不合格原因'].astype('category')
+    return exploded
+
+# 共享数据帧拆分后的不合格原因视图，按数据版本缓存，各统计视图共用
+@st.cache_resource(max_entries=1, show_spinner=False)
+def load_shared_defect_reasons(data_version, _df):
+    return explode_defect_reasons(_df)
+
+# 获取与共享数据帧同一版本的不合格原因视图
+def get_defect_reasons():
+    data_version, df, _ = get_production_snapshot()
+    return load_shared_defect_reasons(data_version, df)
+
+# 统计指定记录（主键）中各不合格原因的出现次数，按次数降序；record_ids 为 None 时统计全部记录
+# reasons 为拆分后的原因视图，未提供时使用共享数据帧的视图
+def count_defect_reasons(record_ids=None, reasons=None):
+    if reasons is None:
+        reasons = get_defect_reasons()
+    if record_ids is not None:
+        reasons = reasons[reasons['记录'].isin(record_ids)]
+    counts = reasons['不合格原因'].value_counts()
+    counts = counts[counts > 0]
+    counts.index = counts.index.astype(str)
+    counts.index.name = '不合格原因'
+    return counts.rename('次数')
+
+# 按产品划分的行位置索引：产品名称 -> 该产品各行在数据帧中的位置，一次 groupby 得到
+def build_product_partitions(df):
+    return df.groupby('产品名称', observed=True, sort=False).indices
+
+# 共享数据帧的按产品分区索引，与数据帧一起按数据版本缓存
+@st.cache_resource(max_entries=1, show_spinner=False)
+def load_shared_product_partitions(data_version, _df):
+    return _df, build_product_partitions(_df)
+
+# 获取数据帧的按产品分区索引；传入的不是当前版本的共享数据帧时（例如其他会话刚刚写入）为它单独计算
+def get_product_partitions(df):
+    data_version = get_data_version()
+    frame, partitions = load_shared_product_partitions(data_version, load_shared_production_data(data_version))
+    return partitions if frame is df else build_product_partitions(df)
+
+# 按分区索引直接取出某个产品的全部记录，无需对产品列做整列比较
+def product_rows(df, partitions, product):
+    positions = partitions.get(product)
+    return df.iloc[positions] if positions is not None else df.iloc[0:0]
+
+# ISO周键的上一周（跨年及53周的年份都按日历推算）
+def previous_iso_week_key(week_key):
+    year, week = divmod(int(week_key), 100)
+    iso_year, iso_week, _ = (pd.Timestamp.fromisocalendar(year, week, 1) - pd.Timedelta(days=7)).isocalendar()
+    return iso_year * 100 + iso_week
+
+# 统计共享数据帧的内存占用，返回 (紧凑类型前, 紧凑类型后) 字节数，按数据版本缓存
+@st.cache_data(show_spinner=False)
+def production_memory_report(data_version, _df):
+    wide = _df.astype({'产品名称': object, '生产数量': 'int64', '合格数量': 'int64', '不合格数量': 'int64', '不合格原因': object, '合格率': 'float64'})
+    return int(wide.memory_usage(deep=True).sum()), int(_df.memory_usage(deep=True).sum())
+
+# 数据帧的紧凑列类型：文本列使用分类类型，数量使用int32，合格率使用float32
+PRODUCTION_COLUMN_DTYPES = {
+    '产品名称': 'category',
+    '生产数量': 'int32',
+    '合格数量': 'int32',
+    '不合格数量': 'int32',
+    '不合格原因': 'category',
+    '合格率': 'float32'
+}
+
+# 将数据库查询结果转换为应用程序使用的DataFrame格式
+def format_production_frame(df):
     # 如果数据不为空，转换列名和日期类型
     if not df.empty:
         # 重命名列以匹配应用程序使用的名称
@@ -408,8 +804,8 @@ def load_data_from_db():
         })
         # 设置日期列为日期类型
         df['日期'] = pd.to_datetime(df['日期'])
-        # 移除id列
-        df = df.drop('id', axis=1)
+        # 使用主键id作为索引，保留行标识用于按主键删除
+        df = df.set_index('id').astype(PRODUCTION_COLUMN_DTYPES)
     else:
         # 如果数据库为空，创建空的DataFrame
         df = pd.DataFrame({
@@ -422,74 +818,703 @@ def load_data_from_db():
             '合格率': []
         })
         df['日期'] = pd.to_datetime(df['日期'])
+        df = df.astype(PRODUCTION_COLUMN_DTYPES)
+        df.index.name = 'id'
     
     return df
 
-# 将数据保存到数据库
-def save_data_to_db(df):
-    conn = sqlite3.connect('production_data.db')
-    # 重命名列以匹配数据库结构
-    df_db = df.copy()
-    df_db = df_db.rename(columns={
-        '日期': 'date',
-        '产品名称': 'product_name',
-        '生产数量': 'production_quantity',
-        '合格数量': 'qualified_quantity',
-        '不合格数量': 'unqualified_quantity',
-        '不合格原因': 'unqualified_reason',
-        '合格率': 'qualification_rate'
-    })
-    # 将日期转换为字符串
-    df_db['date'] = df_db['date'].dt.strftime('%Y-%m-%d')
+# 根据产品和日期范围构造参数化的WHERE条件，可命中 (product_name, date) 和 (date) 索引
+# products 为 None 表示不按产品筛选，空列表表示不返回任何数据
+def build_production_filter(products=None, start_date=None, end_date=None):
+    clauses = []
+    params = []
+    if products is not None:
+        products = list(products)
+        if products:
+            clauses.append(f"product_name IN ({', '.join('?' * len(products))})")
+            params.extend(products)
+        else:
+            clauses.append('0')
+    if start_date is not None:
+        clauses.append('date >= ?')
+        params.append(pd.Timestamp(start_date).strftime('%Y-%m-%d'))
+    if end_date is not None:
+        clauses.append('date <= ?')
+        params.append(pd.Timestamp(end_date).strftime('%Y-%m-%d'))
+    where = (' WHERE ' + ' AND '.join(clauses)) if clauses else ''
+    return where, params
+
+# 在按日期排序的数据帧上用二分查找截取日期范围（包含起止日期），返回连续切片而不是逐行比较
+def slice_date_range(df, start_date=None, end_date=None):
+    dates = df['日期']
+    start = 0 if start_date is None else dates.searchsorted(pd.Timestamp(start_date).normalize(), side='left')
+    end = len(df) if end_date is None else dates.searchsorted(pd.Timestamp(end_date).normalize(), side='right')
+    return df.iloc[start:end]
+
+# 按筛选条件从按日期排序的数据帧取出生产数据：日期范围用二分查找切片，再按产品筛选
+def filter_production_data(df, products=None, start_date=None, end_date=None):
+    df = slice_date_range(df, start_date, end_date)
+    if products is not None:
+        df = df[df['产品名称'].isin(products)]
+    return df
+
+# 按筛选条件从共享数据帧取出生产数据
+def query_production_data(products=None, start_date=None, end_date=None):
+    return filter_production_data(get_production_data(), products, start_date, end_date)
+
+# 按筛选条件统计记录数（使用索引，无需读取数据行）
+def count_production_rows(products=None, start_date=None, end_date=None):
+    where, params = build_production_filter(products, start_date, end_date)
+    with get_db().reader() as conn:
+        return conn.execute(f'SELECT COUNT(*) FROM production_data{where}', params).fetchone()[0]
+
+# 按筛选条件分页查询生产数据（与共享数据帧同样按日期、主键排序），只读取一页的行
+def query_production_page(products=None, start_date=None, end_date=None, offset=0, limit=100):
+    where, params = build_production_filter(products, start_date, end_date)
+    with get_db().reader() as conn:
+        df = pd.read_sql_query(
+            f'SELECT * FROM production_data{where} ORDER BY date, id LIMIT ? OFFSET ?',
+            conn,
+            params=params + [limit, offset]
+        )
+    return format_production_frame(df)
+
+# 导出时每次从游标读取的行数
+EXPORT_CHUNK_SIZE = 10000
+
+# 导出的列：数据库列名和导出文件中的列名
+PRODUCTION_EXPORT_COLUMNS = [
+    ('date', '日期'),
+    ('product_name', '产品名称'),
+    ('production_quantity', '生产数量'),
+    ('qualified_quantity', '合格数量'),
+    ('unqualified_quantity', '不合格数量'),
+    ('unqualified_reason', '不合格原因'),
+    ('qualification_rate', '合格率')
+]
+
+# 按筛选条件从数据库游标分块读取导出的行（按日期、主键排序），每次只在内存中保留一块
+def iter_export_rows(products=None, start_date=None, end_date=None, chunk_size=EXPORT_CHUNK_SIZE):
+    where, params = build_production_filter(products, start_date, end_date)
+    columns = ', '.join(column for column, _ in PRODUCTION_EXPORT_COLUMNS)
+    with get_db().reader() as conn:
+        cursor = conn.execute(f'SELECT {columns} FROM production_data{where} ORDER BY date, id', params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+# 导出文件超过该大小后由内存转存到磁盘上的临时文件
+EXPORT_SPOOL_SIZE = 8 * 1024 * 1024
+
+# 新建导出用的二进制临时文件，关闭后自动删除
+def new_export_file():
+    return tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE, mode='w+b')
+
+# 读取写好的导出文件交给下载按钮，读取后关闭并删除临时文件。
+# 注意：st.download_button 只接受 bytes/str/文件对象，并会把内容整体读入内存交给媒体文件管理器，
+# 因此生成文件时内存占用与导出行数无关，但提供下载时仍需一次与文件大小相同的完整读取
+def read_export_file(export_file):
+    with export_file:
+        export_file.flush()
+        export_file.seek(0)
+        return export_file.read()
+
+# 按筛选条件把生产数据分块写入临时CSV文件，写入过程的内存占用与导出行数无关，返回写好的二进制文件
+def export_production_csv(products=None, start_date=None, end_date=None):
+    export_file = new_export_file()
+    # utf-8-sig 便于 Excel 正确识别中文
+    text_file = io.TextIOWrapper(export_file, encoding='utf-8-sig', newline='')
+    writer = csv.writer(text_file)
+    writer.writerow([header for _, header in PRODUCTION_EXPORT_COLUMNS])
+    for rows in iter_export_rows(products, start_date, end_date):
+        writer.writerows(rows)
+    text_file.flush()
+    # 分离文本包装，避免其被回收时关闭底层文件
+    text_file.detach()
+    return export_file
+
+# Excel单个工作表的最大行数（含表头）
+EXCEL_MAX_ROWS = 1048576
+
+# 转换为Excel单元格的值：缺失值（NaN、NaT、pd.NA）写为空单元格，正负无穷写为文本，与 pandas to_excel 的输出一致
+def excel_cell(value):
+    if value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, (float, np.floating)) and not np.isfinite(value):
+        return None if np.isnan(value) else str(float(value))
+    return value
+
+# 流式Excel写入器：逐行写入，已写完的行不保留在内存中。优先使用 xlsxwriter 的 constant_memory 模式，未安装时使用 openpyxl 的只写模式
+class StreamingExcelWriter:
+    def __init__(self, output):
+        if xlsxwriter is not None:
+            self._workbook = xlsxwriter.Workbook(output, {
+                'constant_memory': True,
+                'default_date_format': 'yyyy-mm-dd',
+                'nan_inf_to_errors': False
+            })
+        else:
+            self._workbook = openpyxl.Workbook(write_only=True)
+        self._output = output
+        self._sheet = None
+        self._row = 0
+    
+    # 新建工作表并写入表头，之后的行只能追加
+    def add_sheet(self, name, header):
+        if xlsxwriter is not None:
+            self._sheet = self._workbook.add_worksheet(name)
+        else:
+            self._sheet = self._workbook.create_sheet(name)
+        self._row = 0
+        self.write_row(header)
+    
+    def write_row(self, values):
+        values = [excel_cell(value) for value in values]
+        if xlsxwriter is not None:
+            self._sheet.write_row(self._row, 0, values)
+        else:
+            self._sheet.append(values)
+        self._row += 1
+    
+    # 写入一个小表（汇总、摘要等）
+    def write_frame(self, name, df):
+        self.add_sheet(name, list(df.columns))
+        for values in df.itertuples(index=False):
+            self.write_row(values)
+    
+    # 从数据库游标分块写入生产数据，超过单表行数上限时续写到新的工作表（原始数据、原始数据_2……）
+    def write_production_rows(self, name, products=None, start_date=None, end_date=None):
+        header = [header for _, header in PRODUCTION_EXPORT_COLUMNS]
+        sheet_count = 1
+        self.add_sheet(name, header)
+        for rows in iter_export_rows(products, start_date, end_date):
+            for row in rows:
+                if self._row >= EXCEL_MAX_ROWS:
+                    sheet_count += 1
+                    self.add_sheet(f"{name}_{sheet_count}", header)
+                # 日期写为Excel日期单元格
+                self.write_row((date.fromisoformat(row[0]),) + row[1:])
+    
+    def close(self):
+        if xlsxwriter is not None:
+            self._workbook.close()
+        else:
+            self._workbook.save(self._output)
+
+# 按需导出CSV的下载按钮：点击时才从数据库生成文件，页面重新运行时不生成也不发送数据
+def csv_download_button(label, file_name, key, products=None, start_date=None, end_date=None):
+    st.download_button(
+        label=label,
+        data=lambda: read_export_file(export_production_csv(products, start_date, end_date)),
+        file_name=file_name,
+        mime="text/csv",
+        key=key
+    )
+
+# 查询所有产品名称（使用索引，无需扫描整表）
+def load_product_names():
+    with get_db().reader() as conn:
+        rows = conn.execute('SELECT DISTINCT product_name FROM production_data ORDER BY product_name').fetchall()
+    return [row[0] for row in rows]
+
+# 查询数据的最早和最晚日期，数据为空时返回 (None, None)
+def load_date_bounds():
+    with get_db().reader() as conn:
+        min_date, max_date = conn.execute('SELECT MIN(date), MAX(date) FROM production_data').fetchone()
+    if min_date is None:
+        return None, None
+    return pd.to_datetime(min_date), pd.to_datetime(max_date)
+
+# 按年、按月分组时使用的派生列表达式（基于月度汇总表的 month 列）
+PERIOD_EXPRESSIONS = {
+    'year': 'substr(month, 1, 4)',
+    'month': 'month'
+}
+
+# 从月度汇总表按年或按月汇总生产、合格、不合格数量（SUM ... GROUP BY），结果以年份/月份为索引
+def query_period_totals(period):
+    expression = PERIOD_EXPRESSIONS[period]
+    with get_db().reader() as conn:
+        df = pd.read_sql_query(f'''
+            SELECT {expression} AS period,
+                   SUM(production_quantity) AS 生产数量,
+                   SUM(qualified_quantity) AS 合格数量,
+                   SUM(unqualified_quantity) AS 不合格数量
+            FROM monthly_rollup
+            GROUP BY {expression}
+            ORDER BY period
+        ''', conn)
+    return df.set_index('period')
+
+# 从每日汇总表查询每日×产品的生产汇总
+def query_daily_rollup(products=None, start_date=None, end_date=None):
+    where, params = build_production_filter(products, start_date, end_date)
+    with get_db().reader() as conn:
+        df = pd.read_sql_query(f'''
+            SELECT date AS 日期,
+                   product_name AS 产品名称,
+                   production_quantity AS 生产数量,
+                   qualified_quantity AS 合格数量,
+                   unqualified_quantity AS 不合格数量,
+                   record_count AS 记录数
+            FROM daily_rollup{where}
+            ORDER BY date, product_name
+        ''', conn, params=params)
+    df['日期'] = pd.to_datetime(df['日期'])
+    return df
+
+# 从月度汇总表查询每月×产品的生产汇总
+def query_monthly_rollup(products=None):
+    where, params = build_production_filter(products)
+    with get_db().reader() as conn:
+        df = pd.read_sql_query(f'''
+            SELECT month AS 月份,
+                   product_name AS 产品名称,
+                   production_quantity AS 生产数量,
+                   qualified_quantity AS 合格数量,
+                   unqualified_quantity AS 不合格数量,
+                   record_count AS 记录数
+            FROM monthly_rollup{where}
+            ORDER BY month, product_name
+        ''', conn, params=params)
+    return df
+
+# 按筛选条件统计各不合格原因的出现次数（关联表连接查询，按次数降序）
+def query_reason_counts(products=None, start_date=None, end_date=None):
+    where, params = build_production_filter(products, start_date, end_date)
+    # 没有筛选条件时无需连接生产数据表
+    join = ' JOIN production_data ON production_data.id = production_defect_reason.record_id' if where else ''
+    with get_db().reader() as conn:
+        return pd.read_sql_query(f'''
+            SELECT defect_reason.name AS 不合格原因, COUNT(*) AS 次数
+            FROM production_defect_reason
+            JOIN defect_reason ON defect_reason.id = production_defect_reason.reason_id{join}{where}
+            GROUP BY defect_reason.name
+            ORDER BY 次数 DESC, defect_reason.name
+        ''', conn, params=params)
+
+# 按筛选条件统计各产品的不合格原因出现次数
+def query_product_reason_counts(products=None, start_date=None, end_date=None):
+    where, params = build_production_filter(products, start_date, end_date)
+    with get_db().reader() as conn:
+        return pd.read_sql_query(f'''
+            SELECT production_data.product_name AS 产品名称, defect_reason.name AS 不合格原因, COUNT(*) AS 次数
+            FROM production_defect_reason
+            JOIN defect_reason ON defect_reason.id = production_defect_reason.reason_id
+            JOIN production_data ON production_data.id = production_defect_reason.record_id{where}
+            GROUP BY production_data.product_name, defect_reason.name
+            ORDER BY production_data.product_name, 次数 DESC, defect_reason.name
+        ''', conn, params=params)
+
+# 将单个产品（或已合并）的月度汇总补齐为连续月份，缺失月份记为0，与按月 resample 的结果一致
+def fill_missing_months(monthly):
+    monthly = monthly.groupby("月份")[["生产数量", "合格数量", "不合格数量", "记录数"]].sum()
+    if monthly.empty:
+        return monthly.reset_index()
+    periods = pd.PeriodIndex(monthly.index, freq="M")
+    all_periods = pd.period_range(periods.min(), periods.max(), freq="M")
+    monthly.index = periods
+    monthly = monthly.reindex(all_periods, fill_value=0)
+    monthly.index = monthly.index.strftime("%Y-%m")
+    monthly.index.name = "月份"
+    return monthly.reset_index()
+
+# 时间汇总粒度（界面选项 -> 粒度）及各粒度使用的日历键列
+ROLLUP_GRANULARITIES = {'日': 'day', '周': 'week', '月': 'month', '季度': 'quarter', '年': 'year'}
+ROLLUP_CALENDAR_KEYS = {'week': 'ISO周', 'month': '年月', 'quarter': '季度', 'year': '年'}
+
+# 将周期键转换为 (周期开始日期, 周期标签)
+def period_key_labels(keys, granularity):
+    if granularity == 'day':
+        return keys, keys.dt.strftime('%Y-%m-%d')
+    text = keys.astype(str)
+    if granularity == 'week':
+        return pd.to_datetime(text + '1', format='%G%V%u'), text.str[:4] + '-W' + text.str[4:]
+    if granularity == 'month':
+        return pd.to_datetime(text, format='%Y%m'), text.str[:4] + '-' + text.str[4:]
+    if granularity == 'quarter':
+        start_months = (keys // 10 * 100 + (keys % 10 - 1) * 3 + 1).astype(str)
+        return pd.to_datetime(start_months, format='%Y%m'), text.str[:4] + 'Q' + text.str[4:]
+    return pd.to_datetime(text, format='%Y'), text
+
+# 多粒度时间汇总：对含 日期/产品名称/数量 列的数据（每日汇总或原始记录）做一次 groupby，
+# 返回各周期（可再按产品细分）的 日期(周期开始)、周期、生产/合格/不合格数量和合格率；
+# df 取自共享数据帧时传入同一快照的 calendar_keys 按主键查找周期键，否则只计算所需的一个键
+def rollup_series(df, granularity='day', products=None, by_product=False, calendar_keys=None):
+    if products is not None:
+        df = df[df['产品名称'].isin(products)]
+    if granularity == 'day':
+        keys = df['日期']
+    elif calendar_keys is not None:
+        keys = calendar_keys.loc[df.index, ROLLUP_CALENDAR_KEYS[granularity]]
+    else:
+        keys = build_calendar_key(df['日期'], ROLLUP_CALENDAR_KEYS[granularity])
+    group_keys = [keys.rename('周期键')] + ([df['产品名称']] if by_product else [])
+    result = df.groupby(group_keys, observed=True)[['生产数量', '合格数量', '不合格数量']].sum().astype('int64').reset_index()
+    period_start, period_label = period_key_labels(result.pop('周期键'), granularity)
+    result.insert(0, '日期', period_start)
+    result.insert(1, '周期', period_label)
+    result['合格率'] = (result['合格数量'] / result['生产数量'] * 100).where(result['生产数量'] > 0, 0.0)
+    return result
+
+# 折线图每条曲线的点数预算（约为图表宽度的像素数），超过时降采样；整张图的点数超过阈值时改用WebGL渲染
+CHART_POINT_BUDGET = 1000
+WEBGL_POINT_THRESHOLD = 2000
+
+# LTTB（Largest-Triangle-Three-Buckets）降采样：返回保留的行位置，在点数预算内保留曲线的峰谷形状
+def lttb_indices(x, y, threshold):
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    # 首尾两点固定保留，中间的点均分到 threshold-2 个桶中，每个桶选一个点
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        # 与上一个选中点、下一个桶的平均点构成的三角形面积最大的点
+        next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous]) - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(area.argmax())
+        selected[bucket + 1] = previous
+    return selected
+
+# 按点数预算对折线数据降采样：按 y_column 的形状选点，其余列取相同的行
+def downsample_line_data(df, x_column, y_column, budget=CHART_POINT_BUDGET):
+    if len(df) <= budget:
+        return df
+    x = df[x_column]
+    if pd.api.types.is_datetime64_any_dtype(x):
+        x = x.astype('int64')
+    return df.iloc[lttb_indices(x.to_numpy(), df[y_column].to_numpy(), budget)]
+
+# 根据整张图的点数选择轨迹类型：点数多时使用WebGL渲染的 Scattergl
+def scatter_trace_type(point_count):
+    return go.Scattergl if point_count > WEBGL_POINT_THRESHOLD else go.Scatter
+
+# 图表缓存的最大条目数，超过时淘汰最久未使用的条目
+VIEW_CACHE_SIZE = 128
+
+# 进程内共享的图表缓存（LRU）：键为 (图表id, 规范化的筛选参数, 数据版本)，值为构建好的图表或统计结果（调用方不得原地修改）
+class ViewCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    # 命中时把条目移到最近使用的位置
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
     
-    # 清空表并插入新数据
-    conn.execute('DELETE FROM production_data')
-    df_db.to_sql('production_data', conn, if_exists='append', index=False)
-    conn.commit()
-    conn.close()
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+@st.cache_resource(show_spinner=False)
+def get_view_cache():
+    return ViewCache(VIEW_CACHE_SIZE)
+
+# 规范化筛选参数：日期统一为 YYYY-MM-DD 字符串，列表转为元组（保留顺序，产品顺序决定图表排列）
+def normalize_view_params(params):
+    normalized = []
+    for name, value in sorted(params.items()):
+        if isinstance(value, (list, tuple)):
+            value = tuple(value)
+        elif hasattr(value, 'isoformat'):
+            value = pd.Timestamp(value).strftime('%Y-%m-%d')
+        normalized.append((name, value))
+    return tuple(normalized)
+
+# 按 (图表id, 筛选参数, 数据版本) 取缓存的图表，未命中时调用 build 构建；筛选和数据都不变时不做任何 pandas 和 Plotly 计算
+# data_version 为调用方读取数据之前或与数据帧一起读取的版本（见 get_production_snapshot），不得在读取数据之后重新查询；
+# 未提供时在构建前读取。构建完成时数据版本已经变化的结果不写入缓存，缓存中的结果总是与键中的版本一致
+def cached_view(view_id, params, build, data_version=None):
+    if data_version is None:
+        data_version = get_data_version()
+    key = (view_id, normalize_view_params(params), data_version)
+    cache = get_view_cache()
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        if get_data_version() == data_version:
+            cache.put(key, value)
+    return value
+
+# 手动重建汇总表
+def rebuild_rollups():
+    with get_db().writer() as conn:
+        rebuild_rollup_tables(conn)
+        # 汇总表内容变化后按数据版本缓存的视图随之失效，版本号与重建在同一事务中更新
+        conn.execute("UPDATE app_meta SET value = value + 1 WHERE key = 'data_version'")
 
-# 添加单条数据到数据库
+# 某一年或某个月的起止日期，period 为 'YYYY' 或 'YYYY-MM'
+def period_date_range(period_key):
+    period = pd.Period(period_key)
+    return period.start_time, period.end_time.normalize()
+
+# 将 st.date_input 的返回值统一为 (开始日期, 结束日期)，只选了一天时开始和结束相同
+def normalize_date_range(date_range):
+    if isinstance(date_range, (list, tuple)):
+        if len(date_range) == 2:
+            return date_range[0], date_range[1]
+        if len(date_range) == 1:
+            return date_range[0], date_range[0]
+        return None, None
+    return date_range, date_range
+
+# 生产数据表格的列格式：由前端按列格式化数字和日期，不使用 pandas Styler
+PRODUCTION_COLUMN_CONFIG = {
+    '日期': st.column_config.DateColumn("日期", format="YYYY-MM-DD"),
+    '生产数量': st.column_config.NumberColumn("生产数量", format="%d"),
+    '合格数量': st.column_config.NumberColumn("合格数量", format="%d"),
+    '不合格数量': st.column_config.NumberColumn("不合格数量", format="%d"),
+    '合格率': st.column_config.NumberColumn("合格率", format="%.2f%%")
+}
+
+# 服务端分页的数据表格：每次只从数据库查询当前页的行，耗时取决于每页行数而不是筛选结果的大小
+def paged_table(key, products=None, start_date=None, end_date=None, page_size=100):
+    total_rows = count_production_rows(products, start_date, end_date)
+    page_count = max((total_rows + page_size - 1) // page_size, 1)
+    page_key = f"{key}_page"
+    # 筛选条件变化后总页数可能变少，在创建控件前把页码限制在范围内，超出时回到最后一页（默认值也通过会话状态设置）
+    st.session_state[page_key] = min(st.session_state.get(page_key, 1), page_count)
+    col1, col2 = st.columns([0.3, 0.7])
+    with col1:
+        page = st.number_input("页码", min_value=1, max_value=page_count, step=1, key=page_key)
+    with col2:
+        st.caption(f"共 {total_rows:,} 条记录，{page_count} 页，每页 {page_size} 条")
+    page_data = query_production_page(products, start_date, end_date, offset=(page - 1) * page_size, limit=page_size)
+    st.dataframe(page_data, column_config=PRODUCTION_COLUMN_CONFIG, use_container_width=True)
+
+# 分页的记录选择表格：每次只向前端发送当前页，选中的记录按主键保存在会话状态中（翻页后保留），返回选中主键的集合
+def record_selector(df, key, page_size=50):
+    selected_key = f"{key}_selected_ids"
+    epoch_key = f"{key}_selection_epoch"
+    # 只保留仍在当前数据中的记录
+    selected_ids = {record_id for record_id in st.session_state.get(selected_key, set()) if record_id in df.index}
+    st.session_state.setdefault(epoch_key, 0)
+
+    page_count = max((len(df) + page_size - 1) // page_size, 1)
+    page_key = f"{key}_page"
+    # 删除记录后总页数可能变少，在创建控件前把页码限制在范围内（默认值也通过会话状态设置）
+    st.session_state[page_key] = min(st.session_state.get(page_key, 1), page_count)
+    col1, col2, col3 = st.columns([0.3, 0.35, 0.35])
+    with col1:
+        page = st.number_input("页码", min_value=1, max_value=page_count, step=1, key=page_key)
+    page_data = df.iloc[(page - 1) * page_size:page * page_size]
+    with col2:
+        if st.button("全选本页", key=f"{key}_select_page"):
+            selected_ids.update(page_data.index)
+            st.session_state[epoch_key] += 1
+    with col3:
+        if st.button("清空选择", key=f"{key}_clear_selection"):
+            selected_ids.clear()
+            st.session_state[epoch_key] += 1
+
+    page_view = pd.DataFrame({
+        '选择': page_data.index.isin(list(selected_ids)),
+        '日期': page_data['日期'],
+        '产品名称': page_data['产品名称'].astype(str),
+        '生产数量': page_data['生产数量'],
+        '合格数量': page_data['合格数量'],
+        '不合格数量': page_data['不合格数量'],
+        '合格率': page_data['合格率']
+    }, index=page_data.index)
+    # 批量选择后更换编辑器的key，避免旧的勾选记录覆盖新的选择；
+    # 编辑器按行位置保存勾选状态，key中包含本页记录主键的哈希，本页记录变化（筛选或其他会话增删）时使用新的编辑器，勾选不会落到别的记录上
+    page_ids_hash = hashlib.md5(page_data.index.to_numpy(dtype='int64').tobytes()).hexdigest()[:16]
+    edited = st.data_editor(
+        page_view,
+        key=f"{key}_editor_{page}_{st.session_state[epoch_key]}_{page_ids_hash}",
+        disabled=[column for column in page_view.columns if column != '选择'],
+        column_config={'选择': st.column_config.CheckboxColumn("选择"), **PRODUCTION_COLUMN_CONFIG},
+        hide_index=True,
+        use_container_width=True
+    )
+    # 用当前页的勾选结果替换本页原有的选择
+    selected_ids.difference_update(page_data.index)
+    selected_ids.update(edited.index[edited['选择']].tolist())
+    st.session_state[selected_key] = selected_ids
+
+    st.caption(f"共 {len(df):,} 条记录，{page_count} 页，已选中 {len(selected_ids)} 条")
+    return selected_ids
+
+# 清空记录选择表格的选择
+def clear_record_selection(key):
+    st.session_state[f"{key}_selected_ids"] = set()
+    st.session_state[f"{key}_selection_epoch"] = st.session_state.get(f"{key}_selection_epoch", 0) + 1
+
+# 添加单条数据到数据库（增量写入：只插入新记录，不重写整表）
+# 不合格原因关联始终从 unqualified_reason 字符串拆分，与回填和拆分视图的统计口径一致
 def add_data_to_db(date, product_name, production_quantity, qualified_quantity, unqualified_quantity, unqualified_reason, qualification_rate):
-    conn = sqlite3.connect('production_data.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO production_data (date, product_name, production_quantity, qualified_quantity, unqualified_quantity, unqualified_reason, qualification_rate)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (date.strftime('%Y-%m-%d'), product_name, production_quantity, qualified_quantity, unqualified_quantity, unqualified_reason, qualification_rate))
-    conn.commit()
-    conn.close()
+    # 单个事务内完成插入，写锁只持有一条记录的时间
+    with get_db().writer() as conn:
+        cursor = conn.execute('''
+            INSERT INTO production_data (date, product_name, production_quantity, qualified_quantity, unqualified_quantity, unqualified_reason, qualification_rate)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (date.strftime('%Y-%m-%d'), product_name, int(production_quantity), int(qualified_quantity), int(unqualified_quantity), unqualified_reason, float(qualification_rate)))
+        record_id = cursor.lastrowid
+        link_defect_reasons(conn, [(record_id, reason) for reason in split_defect_reasons(unqualified_reason)])
+    # 返回新记录的主键
+    return record_id
+
+# 批量插入多条已校验的记录：一个写事务内 executemany，返回插入的记录数
+def add_records_to_db(records):
+    if records.empty:
+        return 0
+    rows = list(zip(
+        records['日期'].dt.strftime('%Y-%m-%d'),
+        records['产品名称'],
+        records['生产数量'].astype(int).tolist(),
+        records['合格数量'].astype(int).tolist(),
+        records['不合格数量'].astype(int).tolist(),
+        records['不合格原因'],
+        records['合格率'].astype(float).tolist()
+    ))
+    with get_db().writer() as conn:
+        conn.executemany('''
+            INSERT INTO production_data (date, product_name, production_quantity, qualified_quantity, unqualified_quantity, unqualified_reason, qualification_rate)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        # 写锁内的 AUTOINCREMENT 主键连续分配，由最后一条的主键反推整批主键
+        first_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0] - len(rows) + 1
+        link_defect_reasons(conn, [
+            (first_id + offset, reason)
+            for offset, text in enumerate(records['不合格原因'])
+            for reason in split_defect_reasons(text)
+        ])
+    return len(rows)
+
+# 批量导入：必需的列、每块行数
+IMPORT_REQUIRED_COLUMNS = ['日期', '产品名称', '生产数量', '合格数量', '不合格数量']
+IMPORT_CHUNK_SIZE = 5000
+
+# 分块读取上传的CSV/Excel文件，逐块返回 (数据块, 已读取进度)，不把整个文件读入内存
+def iter_import_chunks(uploaded_file, chunk_size=IMPORT_CHUNK_SIZE):
+    if uploaded_file.name.lower().endswith('.csv'):
+        total_size = max(uploaded_file.size, 1)
+        reader = pd.read_csv(uploaded_file, chunksize=chunk_size, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+        for chunk in reader:
+            yield chunk, min(uploaded_file.tell() / total_size, 1.0)
+        return
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        total_rows = max((sheet.max_row or 0) - 1, 1)
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else '' for cell in next(rows, ())]
+        width = len(header)
+        chunk, read_rows = [], 0
+        for row in rows:
+            chunk.append(tuple(row[:width]) + (None,) * (width - len(row)))
+            if len(chunk) >= chunk_size:
+                read_rows += len(chunk)
+                yield pd.DataFrame(chunk, columns=header), min(read_rows / total_rows, 1.0)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header), 1.0
+    finally:
+        workbook.close()
+
+# 解析导入的日期列：先按 ISO 8601 快速解析，其余的值再逐个推断格式，
+# 同一块中可以混用多种日期写法，只有确实无法解析的值才会成为 NaT
+def parse_import_dates(values):
+    dates = pd.to_datetime(values, format='ISO8601', errors='coerce')
+    unresolved = dates.isna() & values.notna()
+    if unresolved.any():
+        dates[unresolved] = pd.to_datetime(values[unresolved], format='mixed', errors='coerce')
+    return dates
+
+# 向量化校验一块导入数据，返回 (可写入的记录, 被拒绝的原始行及拒绝原因)
+def validate_import_chunk(chunk):
+    chunk = chunk.rename(columns=lambda column: str(column).strip())
+    missing_columns = [column for column in IMPORT_REQUIRED_COLUMNS if column not in chunk.columns]
+    if missing_columns:
+        raise ValueError(f"缺少必需的列：{'、'.join(missing_columns)}")
+
+    dates = parse_import_dates(chunk['日期'])
+    products = chunk['产品名称'].fillna('').astype(str).str.strip()
+    production = pd.to_numeric(chunk['生产数量'], errors='coerce')
+    qualified = pd.to_numeric(chunk['合格数量'], errors='coerce')
+    unqualified = pd.to_numeric(chunk['不合格数量'], errors='coerce')
+    if '不合格原因' in chunk.columns:
+        reasons = chunk['不合格原因'].fillna('').astype(str).str.strip().replace('', '无')
+    else:
+        reasons = pd.Series('无', index=chunk.index)
+
+    quantities = pd.concat([production, qualified, unqualified], axis=1)
+    bad_quantity = quantities.isna().any(axis=1) | (quantities < 0).any(axis=1) | (quantities % 1 != 0).any(axis=1)
+
+    # 每行只记录第一条不满足的规则，与单条录入的校验顺序一致
+    errors = pd.Series('', index=chunk.index)
+    for mask, message in [
+        (dates.isna(), "日期格式错误"),
+        (products == '', "产品名称为空"),
+        (bad_quantity, "数量必须为非负整数"),
+        (production <= 0, "生产数量必须大于0"),
+        (qualified + unqualified != production, "合格数量 + 不合格数量 必须等于 生产数量"),
+    ]:
+        errors[mask & (errors == '')] = message
+
+    valid = errors == ''
+    records = pd.DataFrame({
+        '日期': dates[valid],
+        '产品名称': products[valid],
+        '生产数量': production[valid].astype('int64'),
+        '合格数量': qualified[valid].astype('int64'),
+        '不合格数量': unqualified[valid].astype('int64'),
+        '不合格原因': reasons[valid],
+        '合格率': qualified[valid] / production[valid] * 100
+    })
+    rejected = chunk[~valid].assign(拒绝原因=errors[~valid])
+    return records, rejected
+
+# 按主键批量删除数据
+def delete_data_from_db(ids, batch_size=500):
+    ids = [int(record_id) for record_id in ids]
+    with get_db().writer() as conn:
+        # 分批构造 DELETE ... WHERE id IN (...)，避免超出SQLite参数数量上限
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            placeholders = ', '.join('?' * len(batch))
+            conn.execute(f'DELETE FROM production_data WHERE id IN ({placeholders})', batch)
 
 # 删除所有数据
 def clear_data_from_db():
-    conn = sqlite3.connect('production_data.db')
-    conn.execute('DELETE FROM production_data')
-    conn.commit()
-    conn.close()
+    with get_db().writer() as conn:
+        conn.execute('DELETE FROM production_data')
 
-# 初始化数据库
-init_db()
+# 进程级启动：数据库结构检查和迁移只在每个进程第一次运行时执行
+@st.cache_resource(show_spinner=False)
+def bootstrap():
+    init_db()
+    return True
 
-# 初始化会话状态 - 从数据库加载数据
-if 'production_data' not in st.session_state:
-    # 从数据库加载数据
-    df = load_data_from_db()
-    
-    # 如果数据库为空，初始化示例数据
-    if df.empty:
-        df = pd.DataFrame({
-            '日期': [datetime.today().strftime('%Y-%m-%d')],
-            '产品名称': ['示例产品'],
-            '生产数量': [0],
-            '合格数量': [0],
-            '不合格数量': [0],
-            '不合格原因': ['无'],
-            '合格率': [0.0]
-        })
-        df['日期'] = pd.to_datetime(df['日期'])
-        # 保存到数据库
-        save_data_to_db(df)
-    
-    st.session_state.production_data = df
+bootstrap()
+mark_run_phase("数据库初始化")
+
+# 新会话开始时，如果数据库为空，初始化示例数据
+if 'production_data' not in st.session_state and get_production_data().empty:
+    add_data_to_db(datetime.today(), '示例产品', 0, 0, 0, '无', 0.0)
+
+# 每次运行都引用进程内共享的数据帧，会话之间不再各自持有副本，并能看到其他会话的写入
+st.session_state.production_data = get_production_data()
+mark_run_phase("加载共享数据")
 
 # 侧边栏导航
 with st.sidebar:
@@ -514,6 +1539,7 @@ with st.sidebar:
     st.markdown("📊 实时数据分析")
     st.markdown("💡 智能优化建议")
     st.markdown("📈 趋势预测分析")
+mark_run_phase("侧边栏导航")
 
 # 数据输入页面
 if selected == "数据输入":
@@ -572,6 +1598,17 @@ if selected == "数据输入":
             # 将不合格原因转换为字符串
             defect_reasons_str = ", ".join(defect_reasons) if defect_reasons else "无"
             
+            # 增量写入数据库（只插入新记录）
+            new_id = add_data_to_db(
+                production_date,
+                product_name,
+                production_quantity,
+                qualified_quantity,
+                unqualified_quantity,
+                defect_reasons_str,
+                pass_rate
+            )
+            
             # 创建新数据记录
             new_record = pd.DataFrame({
                 '日期': [pd.to_datetime(production_date)],
@@ -581,26 +1618,68 @@ if selected == "数据输入":
                 '不合格数量': [unqualified_quantity],
                 '不合格原因': [defect_reasons_str],
                 '合格率': [pass_rate]
-            })
-            
-            # 添加到会话状态的数据中
-            st.session_state.production_data = pd.concat([st.session_state.production_data, new_record], ignore_index=True)
+            }, index=pd.Index([new_id], name='id'))
             
-            # 保存到数据库
-            save_data_to_db(st.session_state.production_data)
+            # 数据版本已变化，从共享缓存取得包含新记录的数据
+            st.session_state.production_data = get_production_data()
             
             st.success("数据提交成功！")
             
             # 显示当前输入的数据
             st.subheader("当前提交的数据")
-            st.dataframe(new_record.style.format({"合格率": "{:.2f}%"}))
+            st.dataframe(new_record, column_config=PRODUCTION_COLUMN_CONFIG)
+
+    # 批量导入
+    st.markdown("---")
+    st.subheader("📂 批量导入")
+    st.caption(f"支持CSV或Excel(.xlsx)文件，需包含列：{'、'.join(IMPORT_REQUIRED_COLUMNS)}；可选列：不合格原因（多个原因用逗号或顿号分隔）")
+    uploaded_file = st.file_uploader("上传数据文件", type=["csv", "xlsx"], key="bulk_import_file")
+
+    if uploaded_file is not None and st.button("开始导入", key="bulk_import_start"):
+        import_progress = st.progress(0.0, text="正在导入...")
+        imported_count = 0
+        rejected_chunks = []
+        processed_rows = 0
+        try:
+            for chunk, fraction in iter_import_chunks(uploaded_file):
+                records, rejected = validate_import_chunk(chunk)
+                # 每块一个写事务，写锁不会被整个文件长时间占用
+                imported_count += add_records_to_db(records)
+                if not rejected.empty:
+                    # 文件行号 = 表头1行 + 块内位置
+                    rejected.insert(0, '文件行号', processed_rows + 2 + (rejected.index - chunk.index[0]))
+                    rejected_chunks.append(rejected)
+                processed_rows += len(chunk)
+                import_progress.progress(fraction, text=f"已处理 {processed_rows:,} 行，成功导入 {imported_count:,} 行")
+        except ValueError as e:
+            st.error(f"导入失败：{e}")
+        except Exception as e:
+            st.error(f"读取文件失败：{e}")
+
+        rejected_count = sum(len(rejected) for rejected in rejected_chunks)
+        if imported_count:
+            # 批量写入后数据版本已变化，共享缓存会重新加载一次
+            st.session_state.production_data = get_production_data()
+            st.success(f"成功导入 {imported_count:,} 条记录")
+        if rejected_count:
+            st.warning(f"有 {rejected_count:,} 行未通过校验，已跳过")
+            rejected_rows = pd.concat(rejected_chunks, ignore_index=True)
+            st.dataframe(rejected_rows.head(100))
+            st.download_button(
+                "下载被拒绝的记录",
+                rejected_rows.to_csv(index=False).encode('utf-8-sig'),
+                file_name="rejected_rows.csv",
+                mime="text/csv"
+            )
 
 # 数据可视化页面
 elif selected == "数据可视化":
     st.title("📈 生产数据可视化分析")
     st.markdown("---")
     
-    if st.session_state.production_data.empty:
+    all_products = load_product_names()
+    
+    if not all_products:
         st.warning("暂无数据，请先在数据输入页面添加数据")
     else:
         # 数据筛选
@@ -610,30 +1689,34 @@ elif selected == "数据可视化":
         with col1:
             product_filter = st.multiselect(
                 "选择产品",
-                options=st.session_state.production_data["产品名称"].unique(),
-                default=st.session_state.production_data["产品名称"].unique()
+                options=all_products,
+                default=all_products
             )
         
         with col2:
             # 设置默认日期范围
-            if not st.session_state.production_data.empty:
-                default_date = (st.session_state.production_data["日期"].min(), st.session_state.production_data["日期"].max())
-            else:
-                # 当数据为空时，默认显示今天到今天
-                today = datetime.today()
-                default_date = (today, today)
+            min_date, max_date = load_date_bounds()
+            default_date = (min_date, max_date)
             
             date_range = st.date_input(
                 "选择日期范围",
                 value=default_date
             )
         
-        # 应用筛选
-        filtered_data = st.session_state.production_data[
-            (st.session_state.production_data["产品名称"].isin(product_filter)) &
-            (st.session_state.production_data["日期"] >= pd.to_datetime(date_range[0])) &
-            (st.session_state.production_data["日期"] <= pd.to_datetime(date_range[1]))
-        ].sort_values("日期")
+        # 应用筛选：在按日期排序的共享数据上截取日期范围，再按产品筛选
+        start_date, end_date = normalize_date_range(date_range)
+        visual_filter = dict(
+            products=None if len(product_filter) == len(all_products) else product_filter,
+            start_date=start_date,
+            end_date=end_date
+        )
+        # 数据版本与数据帧一起读取，图表缓存使用该版本，保证缓存的图表与筛选出的数据属于同一版本
+        visual_version, visual_source, _ = get_production_snapshot()
+        filtered_data = filter_production_data(visual_source, **visual_filter)
+        
+        # 删除后页面已重新运行，显示删除结果
+        if "visual_delete_message" in st.session_state:
+            st.success(st.session_state.pop("visual_delete_message"))
         
         if filtered_data.empty:
             st.warning("筛选条件下暂无数据")
@@ -643,48 +1726,35 @@ elif selected == "数据可视化":
             
             # 添加删除数据功能
             if not filtered_data.empty:
-                # 创建复选框选择器
+                # 创建分页记录选择器
                 st.markdown("### 🗑️ 数据删除功能")
                 
-                # 获取筛选后的数据索引
-                data_indices = filtered_data.index.tolist()
-                
-                # 创建一个字典来存储选中的行
-                selected_rows = []
-                
-                # 显示数据并添加复选框
-                for i, (index, row) in enumerate(filtered_data.iterrows()):
-                    col1, col2 = st.columns([0.1, 0.9])
-                    with col1:
-                        if st.checkbox("", key=f"delete_{index}"):
-                            selected_rows.append(index)
-                    with col2:
-                        st.write(f"**{row['产品名称']}** - {row['日期'].strftime('%Y-%m-%d')}: 生产 {row['生产数量']} 件, 合格率 {row['合格率']:.2f}%")
+                # 分页选择要删除的记录（选择按记录主键保存，翻页不丢失）
+                selected_rows = record_selector(filtered_data, key="visual_delete")
                 
-                # 删除按钮
+                # 确认后才执行删除
+                confirm_delete = st.checkbox("确认要删除选中的数据吗？此操作不可恢复", key="visual_delete_confirm")
                 if st.button("删除选中数据", type="secondary", help="此操作将删除选中的生产记录，请谨慎操作"):
-                    if selected_rows:
-                        # 确认删除
-                        confirm_delete = st.checkbox("确认要删除选中的数据吗？此操作不可恢复")
-                        if confirm_delete:
-                            # 从会话状态中删除数据
-                            st.session_state.production_data = st.session_state.production_data.drop(selected_rows)
-                            
-                            # 重置索引
-                            st.session_state.production_data = st.session_state.production_data.reset_index(drop=True)
-                            
-                            # 保存到数据库
-                            save_data_to_db(st.session_state.production_data)
-                            
-                            st.success(f"成功删除 {len(selected_rows)} 条数据")
-                            
-                            # 页面将在下次用户交互时自动刷新，无需显式调用 rerun
-                    else:
+                    if not selected_rows:
                         st.warning("请先选择要删除的数据")
+                    elif not confirm_delete:
+                        st.warning("请先勾选确认删除")
+                    else:
+                        # 按主键从数据库中删除
+                        delete_data_from_db(selected_rows)
+                        
+                        # 从共享缓存取得删除后的数据
+                        st.session_state.production_data = get_production_data()
+                        clear_record_selection("visual_delete")
+                        
+                        # 重新运行页面，表格和图表都基于删除后的数据重新筛选
+                        st.session_state.visual_delete_message = f"成功删除 {len(selected_rows)} 条数据"
+                        st.rerun()
             
             # 显示筛选后的数据表格
             st.subheader("数据表格")
-            st.dataframe(filtered_data.style.format({"合格率": "{:.2f}%"}))
+            # 服务端分页：每次只查询并发送当前页，数字格式由列配置完成
+            paged_table("visual_table", **visual_filter)
             
             # 数据可视化
             st.subheader("生产数据分析图表")
@@ -692,104 +1762,139 @@ elif selected == "数据可视化":
             # 1. 生产数量与合格数量趋势图
             st.markdown("#### 生产数量与合格数量趋势")
             
-            # 按产品类别分别绘制趋势图
-            for product in product_filter:
-                # 过滤当前产品的数据
-                product_data = filtered_data[filtered_data["产品名称"] == product]
-                
-                # 创建趋势图
-                fig1 = go.Figure()
-                fig1.add_trace(go.Scatter(
-                    x=product_data["日期"],
-                    y=product_data["生产数量"],
-                    name="生产数量",
-                    mode="lines+markers",
-                    line=dict(color="#2196F3", width=2)
-                ))
-                fig1.add_trace(go.Scatter(
-                    x=product_data["日期"],
-                    y=product_data["合格数量"],
-                    name="合格数量",
-                    mode="lines+markers",
-                    line=dict(color="#4CAF50", width=2)
-                ))
+            # 图表按 (图表id, 筛选条件, 筛选数据的版本) 缓存，筛选和数据都不变时重新运行不再重建图表
+            visual_params = dict(products=product_filter, start_date=start_date, end_date=end_date)
+            
+            def build_trend_figure():
+                # 所有产品合并为一张小多图：一次分区逐个产品取行，每个产品按点数预算降采样
+                filtered_partitions = build_product_partitions(filtered_data)
+                trend_products = [product for product in product_filter if product in filtered_partitions]
+                facet_columns = 2 if len(trend_products) > 1 else 1
+                facet_rows = max((len(trend_products) + facet_columns - 1) // facet_columns, 1)
+                product_series = {
+                    product: downsample_line_data(
+                        product_rows(filtered_data, filtered_partitions, product), "日期", "生产数量", CHART_POINT_BUDGET // facet_columns
+                    )
+                    for product in trend_products
+                }
+                trend_trace = scatter_trace_type(sum(len(product_data) for product_data in product_series.values()) * 2)
+                trend_mode = "lines+markers" if trend_trace is go.Scatter else "lines"
+                
+                fig1 = make_subplots(
+                    rows=facet_rows,
+                    cols=facet_columns,
+                    subplot_titles=[f"{product}生产与合格数量趋势" for product in trend_products],
+                    vertical_spacing=min(0.3 / facet_rows, 0.1)
+                )
+                for i, (product, product_data) in enumerate(product_series.items()):
+                    row, col = i // facet_columns + 1, i % facet_columns + 1
+                    fig1.add_trace(trend_trace(
+                        x=product_data["日期"],
+                        y=product_data["生产数量"],
+                        name="生产数量",
+                        mode=trend_mode,
+                        line=dict(color="#2196F3", width=2),
+                        legendgroup="生产数量",
+                        showlegend=i == 0
+                    ), row=row, col=col)
+                    fig1.add_trace(trend_trace(
+                        x=product_data["日期"],
+                        y=product_data["合格数量"],
+                        name="合格数量",
+                        mode=trend_mode,
+                        line=dict(color="#4CAF50", width=2),
+                        legendgroup="合格数量",
+                        showlegend=i == 0
+                    ), row=row, col=col)
                 
-                # 设置图表标题为当前产品名称
                 fig1.update_layout(
-                    title=f"{product}生产与合格数量趋势",
-                    xaxis_title="日期",
-                    yaxis_title="数量",
+                    height=320 * facet_rows,
                     legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
                     template="plotly_white",
                     font=dict(color="#000000"),  # 设置所有字体为黑色
-                    xaxis=dict(title_font=dict(color="#000000"), tickfont=dict(color="#000000")),
-                    yaxis=dict(title_font=dict(color="#000000"), tickfont=dict(color="#000000")),
                     legend_font=dict(color="#000000")
                 )
-                
-                # 显示当前产品的趋势图
-                st.plotly_chart(fig1, use_container_width=True)
+                fig1.update_xaxes(tickfont=dict(color="#000000"))
+                fig1.update_yaxes(title_text="数量", title_font=dict(color="#000000"), tickfont=dict(color="#000000"))
+                return fig1
+            
+            st.plotly_chart(cached_view("visual_trend", visual_params, build_trend_figure, visual_version), use_container_width=True)
             
             # 2. 合格率趋势图
             st.markdown("#### 产品合格率趋势")
-            fig2 = px.line(
-                filtered_data,
-                x="日期",
-                y="合格率",
-                color="产品名称",
-                markers=True,
-                title="产品合格率趋势",
-                labels={"合格率": "合格率(%)"},
-                template="plotly_white"
-            )
-            fig2.update_layout(
-                yaxis_ticksuffix="%",
-                yaxis_range=[0, 100]
-            )
-            st.plotly_chart(fig2, use_container_width=True)
+            
+            def build_rate_figure():
+                # 每个产品的合格率曲线同样按点数预算降采样，点数多时使用WebGL渲染
+                filtered_partitions = build_product_partitions(filtered_data)
+                trend_products = [product for product in product_filter if product in filtered_partitions]
+                rate_data = pd.concat([
+                    downsample_line_data(product_rows(filtered_data, filtered_partitions, product), "日期", "合格率")
+                    for product in trend_products
+                ]) if trend_products else filtered_data
+                rate_webgl = len(rate_data) > WEBGL_POINT_THRESHOLD
+                fig2 = px.line(
+                    rate_data,
+                    x="日期",
+                    y="合格率",
+                    color="产品名称",
+                    markers=not rate_webgl,
+                    render_mode="webgl" if rate_webgl else "svg",
+                    title="产品合格率趋势",
+                    labels={"合格率": "合格率(%)"},
+                    template="plotly_white"
+                )
+                fig2.update_layout(
+                    yaxis_ticksuffix="%",
+                    yaxis_range=[0, 100]
+                )
+                return fig2
+            
+            st.plotly_chart(cached_view("visual_rate", visual_params, build_rate_figure, visual_version), use_container_width=True)
             
             # 3. 不合格原因分析饼图
             st.markdown("#### 不合格原因分布")
             
-            # 解析所有不合格原因
-            all_reasons = []
-            for reasons in filtered_data["不合格原因"]:
-                if reasons and reasons != "无":
-                    all_reasons.extend([reason.strip() for reason in reasons.split(",")])
+            # 从同一版本的共享拆分视图中按筛选出的记录主键统计不合格原因，无需重新拆分（统计结果同样按筛选条件缓存）
+            reason_counts = cached_view(
+                "visual_reason_counts",
+                visual_params,
+                lambda: count_defect_reasons(filtered_data.index, load_shared_defect_reasons(visual_version, visual_source)).reset_index(),
+                visual_version
+            )
             
-            if all_reasons:
-                reason_df = pd.DataFrame(all_reasons, columns=["不合格原因"])
-                reason_counts = reason_df["不合格原因"].value_counts().reset_index()
-                reason_counts.columns = ["不合格原因", "次数"]
+            if not reason_counts.empty:
                 
                 # 显示不合格原因及对应的数量
                 st.markdown("### 不合格原因数量统计")
                 for reason, count in reason_counts.itertuples(index=False):
                     st.write(f"- **{reason}**: {count} 件")
                 
-                fig3 = px.pie(
-                    reason_counts,
-                    values="次数",
-                    names="不合格原因",
-                    title="不合格原因分布",
-                    template="plotly_white",
-                    hole=0.3,
-                    hover_data={"次数": True},  # 悬停时显示数量
-                    labels={"次数": "数量"}
-                )
-                # 设置图例和文本颜色为黑色以提高可见性
-                fig3.update_traces(
-                    textinfo='label+value+percent',  # 显示标签、数量和百分比
-                    textposition='outside',
-                    marker=dict(line=dict(color='#000000', width=1)),
-                    textfont=dict(color='#000000')
-                )
-                fig3.update_layout(
-                    font=dict(color='#000000'),
-                    title_font=dict(color='#000000'),
-                    legend_font=dict(color='#000000')
-                )
-                st.plotly_chart(fig3, use_container_width=True)
+                def build_reason_figure():
+                    fig3 = px.pie(
+                        reason_counts,
+                        values="次数",
+                        names="不合格原因",
+                        title="不合格原因分布",
+                        template="plotly_white",
+                        hole=0.3,
+                        hover_data={"次数": True},  # 悬停时显示数量
+                        labels={"次数": "数量"}
+                    )
+                    # 设置图例和文本颜色为黑色以提高可见性
+                    fig3.update_traces(
+                        textinfo='label+value+percent',  # 显示标签、数量和百分比
+                        textposition='outside',
+                        marker=dict(line=dict(color='#000000', width=1)),
+                        textfont=dict(color='#000000')
+                    )
+                    fig3.update_layout(
+                        font=dict(color='#000000'),
+                        title_font=dict(color='#000000'),
+                        legend_font=dict(color='#000000')
+                    )
+                    return fig3
+                
+                st.plotly_chart(cached_view("visual_reasons", visual_params, build_reason_figure, visual_version), use_container_width=True)
             else:
                 st.info("暂无不合格数据")
 
@@ -798,15 +1903,19 @@ elif selected == "分析报告":
     st.title("📋 数据分析报告")
     st.markdown("---")
     
-    if st.session_state.production_data.empty:
+    # 在数据库中按年、按月汇总，页面耗时与历史数据量无关
+    year_totals = query_period_totals('year')
+    month_totals = query_period_totals('month')
+    
+    if year_totals.empty:
         st.warning("暂无数据，请先在数据输入页面添加数据")
     else:
         st.subheader("数据分析摘要")
         
         # 总体生产情况
-        total_production = st.session_state.production_data["生产数量"].sum()
-        total_qualified = st.session_state.production_data["合格数量"].sum()
-        total_unqualified = st.session_state.production_data["不合格数量"].sum()
+        total_production = int(year_totals["生产数量"].sum())
+        total_qualified = int(year_totals["合格数量"].sum())
+        total_unqualified = int(year_totals["不合格数量"].sum())
         overall_pass_rate = (total_qualified / total_production) * 100 if total_production > 0 else 0
         
         # 显示关键指标
@@ -834,36 +1943,33 @@ elif selected == "分析报告":
         
         st.markdown("---")
         
-        # 年度总结报告
-        st.subheader("年度总结报告")
-        
-        # 选择年份
-        years = st.session_state.production_data["日期"].dt.year.unique()
-        years = sorted(years)
-        selected_year = st.selectbox("选择年份", years, index=len(years)-1, key="year_select")
-        
-        # 筛选当年数据
-        year_data = st.session_state.production_data[
-            st.session_state.production_data["日期"].dt.year == selected_year
-        ]
-        
-        if not year_data.empty:
-            # 年度生产情况
-            year_production = year_data["生产数量"].sum()
-            year_qualified = year_data["合格数量"].sum()
-            year_unqualified = year_data["不合格数量"].sum()
-            year_pass_rate = (year_qualified / year_production) * 100 if year_production > 0 else 0
-            
-            # 年度不合格原因分析
-            all_year_reasons = []
-            for reasons in year_data["不合格原因"]:
-                if reasons and reasons != "无":
-                    all_year_reasons.extend([reason.strip() for reason in reasons.split(",")])
-            
-            st.markdown(f"#### {selected_year} 生产年报")
-            
-            # 年度报告内容
-            year_report_content = f"""
+        # 年度总结报告（独立片段：切换年份时只重新运行本片段）
+        @st.fragment
+        def year_report_fragment(year_totals):
+            st.subheader("年度总结报告")
+            
+            # 选择年份
+            years = year_totals.index.tolist()
+            selected_year = st.selectbox("选择年份", years, index=len(years)-1, key="year_select")
+            
+            # 查询当年数据
+            year_start, year_end = period_date_range(selected_year)
+            year_data = query_production_data(start_date=year_start, end_date=year_end)
+            
+            if not year_data.empty:
+                # 年度生产情况
+                year_production = int(year_totals.loc[selected_year, "生产数量"])
+                year_qualified = int(year_totals.loc[selected_year, "合格数量"])
+                year_unqualified = int(year_totals.loc[selected_year, "不合格数量"])
+                year_pass_rate = (year_qualified / year_production) * 100 if year_production > 0 else 0
+                
+                # 年度不合格原因分析
+                year_reason_counts = count_defect_reasons(year_data.index)
+                
+                st.markdown(f"#### {selected_year} 生产年报")
+                
+                # 年度报告内容
+                year_report_content = f"""
 ## {selected_year} 产品生产年度总结报告
 
 ### 一、生产概况
@@ -874,76 +1980,74 @@ elif selected == "分析报告":
 
 ### 二、质量分析
 """
-            
-            # 不合格原因分析
-            if all_year_reasons:
-                year_reason_counts = pd.Series(all_year_reasons).value_counts()
-                year_top_reason = year_reason_counts.idxmax()
-                year_top_reason_count = year_reason_counts.max()
-                
-                year_report_content += f"### 三、不合格原因分析\n"
-                year_report_content += f"年度主要不合格原因为：{year_top_reason}，共发生 {year_top_reason_count} 次\n\n"
-                year_report_content += "各不合格原因分布如下：\n"
-                for reason, count in year_reason_counts.items():
-                    year_report_content += f"- {reason}：{count} 次 ({count/year_unqualified*100:.1f}%)\n"
-            else:
-                year_report_content += "### 三、质量情况\n"
-                year_report_content += "本年度生产的产品全部合格，未发现不合格产品\n"
-            
-            # 年度改善方案
-            year_report_content += "\n### 四、年度改善建议\n"
-            year_report_content += "1. 根据全年质量数据，重点关注主要不合格原因的改善\n"
-            year_report_content += "2. 建立年度质量回顾机制，总结经验教训\n"
-            year_report_content += "3. 制定下年度质量目标和改进计划\n"
-            year_report_content += "4. 加强员工技能培训，提高质量意识\n"
-            year_report_content += "5. 优化生产工艺和设备维护计划\n"
-            
-            # 显示年度报告
-            st.text_area("年度报告", year_report_content, height=500, key="year_report")
-            
-            # 下载年度数据
-            st.markdown(
-                get_csv_download_link(
-                    year_data,
+                
+                # 不合格原因分析
+                if not year_reason_counts.empty:
+                    year_top_reason = year_reason_counts.idxmax()
+                    year_top_reason_count = year_reason_counts.max()
+                    
+                    year_report_content += f"### 三、不合格原因分析\n"
+                    year_report_content += f"年度主要不合格原因为：{year_top_reason}，共发生 {year_top_reason_count} 次\n\n"
+                    year_report_content += "各不合格原因分布如下：\n"
+                    for reason, count in year_reason_counts.items():
+                        year_report_content += f"- {reason}：{count} 次 ({count/year_unqualified*100:.1f}%)\n"
+                else:
+                    year_report_content += "### 三、质量情况\n"
+                    year_report_content += "本年度生产的产品全部合格，未发现不合格产品\n"
+                
+                # 年度改善方案
+                year_report_content += "\n### 四、年度改善建议\n"
+                year_report_content += "1. 根据全年质量数据，重点关注主要不合格原因的改善\n"
+                year_report_content += "2. 建立年度质量回顾机制，总结经验教训\n"
+                year_report_content += "3. 制定下年度质量目标和改进计划\n"
+                year_report_content += "4. 加强员工技能培训，提高质量意识\n"
+                year_report_content += "5. 优化生产工艺和设备维护计划\n"
+                
+                # 显示年度报告
+                st.text_area("年度报告", year_report_content, height=500, key="year_report")
+                
+                # 下载年度数据
+                csv_download_button(
+                    "📥 下载年度生产数据",
                     f"{selected_year}_production_data.csv",
-                    "📥 下载年度生产数据"
-                ),
-                unsafe_allow_html=True
-            )
-        else:
-            st.info(f"{selected_year} 暂无生产数据")
-        
-        st.markdown("---")
-        
-        # 月度总结报告
-        st.subheader("月度总结报告")
+                    key="year_data_download",
+                    start_date=year_start,
+                    end_date=year_end
+                )
+            else:
+                st.info(f"{selected_year} 暂无生产数据")
         
-        # 选择月份
-        months = st.session_state.production_data["日期"].dt.strftime("%Y-%m").unique()
-        selected_month = st.selectbox("选择月份", months, index=len(months)-1, key="month_select")
+        year_report_fragment(year_totals)
         
-        # 筛选当月数据
-        month_data = st.session_state.production_data[
-            st.session_state.production_data["日期"].dt.strftime("%Y-%m") == selected_month
-        ]
+        st.markdown("---")
         
-        if not month_data.empty:
-            # 月度生产情况
-            month_production = month_data["生产数量"].sum()
-            month_qualified = month_data["合格数量"].sum()
-            month_unqualified = month_data["不合格数量"].sum()
-            month_pass_rate = (month_qualified / month_production) * 100 if month_production > 0 else 0
-            
-            # 月度不合格原因分析
-            all_month_reasons = []
-            for reasons in month_data["不合格原因"]:
-                if reasons and reasons != "无":
-                    all_month_reasons.extend([reason.strip() for reason in reasons.split(",")])
-            
-            st.markdown(f"#### {selected_month} 生产月报")
-            
-            # 报告内容
-            report_content = f"""
+        # 月度总结报告（独立片段：切换月份或汇总粒度时只重新运行本片段）
+        @st.fragment
+        def month_report_fragment(month_totals):
+            st.subheader("月度总结报告")
+            
+            # 选择月份
+            months = month_totals.index.tolist()
+            selected_month = st.selectbox("选择月份", months, index=len(months)-1, key="month_select")
+            
+            # 查询当月数据
+            month_start, month_end = period_date_range(selected_month)
+            month_data = query_production_data(start_date=month_start, end_date=month_end)
+            
+            if not month_data.empty:
+                # 月度生产情况
+                month_production = int(month_totals.loc[selected_month, "生产数量"])
+                month_qualified = int(month_totals.loc[selected_month, "合格数量"])
+                month_unqualified = int(month_totals.loc[selected_month, "不合格数量"])
+                month_pass_rate = (month_qualified / month_production) * 100 if month_production > 0 else 0
+                
+                # 月度不合格原因分析
+                reason_counts = count_defect_reasons(month_data.index)
+                
+                st.markdown(f"#### {selected_month} 生产月报")
+                
+                # 报告内容
+                report_content = f"""
 ## {selected_month} 产品生产月度总结报告
 
 ### 一、生产概况
@@ -954,334 +2058,325 @@ elif selected == "分析报告":
 
 ### 二、质量分析
 """
-            
-            # 不合格原因分析
-            if all_month_reasons:
-                reason_counts = pd.Series(all_month_reasons).value_counts()
-                top_reason = reason_counts.idxmax()
-                top_reason_count = reason_counts.max()
                 
-                report_content += f"### 三、不合格原因分析\n"
-                report_content += f"本月主要不合格原因为：{top_reason}，共发生 {top_reason_count} 次\n\n"
-                report_content += "各不合格原因分布如下：\n"
-                for reason, count in reason_counts.items():
-                    report_content += f"- {reason}：{count} 次 ({count/month_unqualified*100:.1f}%)\n"
+                # 不合格原因分析
+                if not reason_counts.empty:
+                    top_reason = reason_counts.idxmax()
+                    top_reason_count = reason_counts.max()
+                    
+                    report_content += f"### 三、不合格原因分析\n"
+                    report_content += f"本月主要不合格原因为：{top_reason}，共发生 {top_reason_count} 次\n\n"
+                    report_content += "各不合格原因分布如下：\n"
+                    for reason, count in reason_counts.items():
+                        report_content += f"- {reason}：{count} 次 ({count/month_unqualified*100:.1f}%)\n"
+                    
+                    # 深层原因分析
+                    report_content += "\n### 四、深层原因分析\n"
+                    
+                    # 根据主要不合格原因提供详细的可能因素分析
+                    if top_reason == "外观缺陷":
+                        report_content += "#### 外观缺陷可能因素分析\n"
+                        report_content += "- **原材料因素**：原材料批次间颜色差异、原材料杂质含量过高、原材料表面质量问题\n"
+                        report_content += "- **生产环境**：车间温度/湿度控制不当、生产环境粉尘过多、光照条件影响质量检查\n"
+                        report_content += "- **工艺操作**：注塑温度/压力/速度参数设置不当、模具温度控制不稳定、脱模剂使用不当\n"
+                        report_content += "- **设备问题**：模具表面磨损、设备震动过大、成型设备温度控制系统故障\n"
+                    elif top_reason == "尺寸偏差":
+                        report_content += "#### 尺寸偏差可能因素分析\n"
+                        report_content += "- **设备精度**：加工设备精度不足、设备定期校准不到位、设备主轴跳动过大\n"
+                        report_content += "- **模具问题**：模具磨损、模具设计不合理、模具装配精度不足\n"
+                        report_content += "- **原材料特性**：原材料收缩率不稳定、原材料含水率变化、原材料批次间密度差异\n"
+                        report_content += "- **工艺参数**：注塑压力/速度/保压时间设置不当、冷却时间不足、成型温度不稳定\n"
+                        report_content += "- **操作因素**：工件装夹定位不准确、操作人员测量方法不规范\n"
+                    elif top_reason == "性能不达标":
+                        report_content += "#### 性能不达标可能因素分析\n"
+                        report_content += "- **材料配方**：原材料配方比例不准确、添加剂使用不当、材料老化问题\n"
+                        report_content += "- **工艺参数**：固化温度/时间不足、热处理工艺参数设置不当、成型压力不够\n"
+                        report_content += "- **设备问题**：设备老化、设备传感器不准确、设备校准过期\n"
+                        report_content += "- **测试环节**：测试方法不准确、测试设备故障、测试环境不符合标准\n"
+                    elif top_reason == "材料问题":
+                        report_content += "#### 材料问题可能因素分析\n"
+                        report_content += "- **供应商因素**：供应商质量控制不严、供应商更换原材料批次、原材料运输过程损坏\n"
+                        report_content += "- **存储条件**：原材料存储温度/湿度不符合要求、存储时间过长导致材料老化、存储环境污染\n"
+                        report_content += "- **采购管理**：采购批次质量波动、原材料验收标准不严格、供应商评估体系不完善\n"
+                    elif top_reason == "工艺问题":
+                        report_content += "#### 工艺问题可能因素分析\n"
+                        report_content += "- **工艺设计**：工艺流程不合理、工艺参数设置范围过宽、工艺验证不充分\n"
+                        report_content += "- **工艺执行**：操作人员未严格按照工艺文件执行、工艺参数记录不完整、工艺变更未验证\n"
+                        report_content += "- **工艺培训**：员工对工艺要求理解不深入、新员工工艺培训不足、工艺文件更新不及时\n"
+                    elif top_reason == "设备故障":
+                        report_content += "#### 设备故障可能因素分析\n"
+                        report_content += "- **维护管理**：设备维护计划执行不到位、维护记录不完整、关键部件更换不及时\n"
+                        report_content += "- **设备状态**：设备老化严重、设备超负荷运行、设备安装精度下降\n"
+                        report_content += "- **操作因素**：操作人员违规操作、操作人员缺乏设备维护知识、设备操作规程不清晰\n"
+                    elif top_reason == "操作失误":
+                        report_content += "#### 操作失误可能因素分析\n"
+                        report_content += "- **人员培训**：新员工培训不足、定期技能培训缺失、操作考核不严格\n"
+                        report_content += "- **工作环境**：工作强度过大、工作环境嘈杂、照明条件不佳\n"
+                        report_content += "- **管理因素**：操作流程不清晰、质量控制点设置不合理、现场管理不到位\n"
+                    else:
+                        report_content += "#### 其他不良原因分析\n"
+                        report_content += "- 建议对不合格产品进行详细检测，包括外观、尺寸、性能等方面\n"
+                        report_content += "- 进行鱼骨图分析或5W1H分析法，找出具体原因\n"
+                        report_content += "- 对生产过程进行全面排查，包括原材料、设备、工艺、人员等环节\n"
+                else:
+                    report_content += "### 三、质量情况\n"
+                    report_content += "本月生产的产品全部合格，未发现不合格产品\n"
                 
-                # 深层原因分析
-                report_content += "\n### 四、深层原因分析\n"
+                # 优化建议
+                report_content += "\n### 五、改善方案\n"
                 
-                # 根据主要不合格原因提供详细的可能因素分析
-                if top_reason == "外观缺陷":
-                    report_content += "#### 外观缺陷可能因素分析\n"
-                    report_content += "- **原材料因素**：原材料批次间颜色差异、原材料杂质含量过高、原材料表面质量问题\n"
-                    report_content += "- **生产环境**：车间温度/湿度控制不当、生产环境粉尘过多、光照条件影响质量检查\n"
-                    report_content += "- **工艺操作**：注塑温度/压力/速度参数设置不当、模具温度控制不稳定、脱模剂使用不当\n"
-                    report_content += "- **设备问题**：模具表面磨损、设备震动过大、成型设备温度控制系统故障\n"
-                elif top_reason == "尺寸偏差":
-                    report_content += "#### 尺寸偏差可能因素分析\n"
-                    report_content += "- **设备精度**：加工设备精度不足、设备定期校准不到位、设备主轴跳动过大\n"
-                    report_content += "- **模具问题**：模具磨损、模具设计不合理、模具装配精度不足\n"
-                    report_content += "- **原材料特性**：原材料收缩率不稳定、原材料含水率变化、原材料批次间密度差异\n"
-                    report_content += "- **工艺参数**：注塑压力/速度/保压时间设置不当、冷却时间不足、成型温度不稳定\n"
-                    report_content += "- **操作因素**：工件装夹定位不准确、操作人员测量方法不规范\n"
-                elif top_reason == "性能不达标":
-                    report_content += "#### 性能不达标可能因素分析\n"
-                    report_content += "- **材料配方**：原材料配方比例不准确、添加剂使用不当、材料老化问题\n"
-                    report_content += "- **工艺参数**：固化温度/时间不足、热处理工艺参数设置不当、成型压力不够\n"
-                    report_content += "- **设备问题**：设备老化、设备传感器不准确、设备校准过期\n"
-                    report_content += "- **测试环节**：测试方法不准确、测试设备故障、测试环境不符合标准\n"
-                elif top_reason == "材料问题":
-                    report_content += "#### 材料问题可能因素分析\n"
-                    report_content += "- **供应商因素**：供应商质量控制不严、供应商更换原材料批次、原材料运输过程损坏\n"
-                    report_content += "- **存储条件**：原材料存储温度/湿度不符合要求、存储时间过长导致材料老化、存储环境污染\n"
-                    report_content += "- **采购管理**：采购批次质量波动、原材料验收标准不严格、供应商评估体系不完善\n"
-                elif top_reason == "工艺问题":
-                    report_content += "#### 工艺问题可能因素分析\n"
-                    report_content += "- **工艺设计**：工艺流程不合理、工艺参数设置范围过宽、工艺验证不充分\n"
-                    report_content += "- **工艺执行**：操作人员未严格按照工艺文件执行、工艺参数记录不完整、工艺变更未验证\n"
-                    report_content += "- **工艺培训**：员工对工艺要求理解不深入、新员工工艺培训不足、工艺文件更新不及时\n"
-                elif top_reason == "设备故障":
-                    report_content += "#### 设备故障可能因素分析\n"
-                    report_content += "- **维护管理**：设备维护计划执行不到位、维护记录不完整、关键部件更换不及时\n"
-                    report_content += "- **设备状态**：设备老化严重、设备超负荷运行、设备安装精度下降\n"
-                    report_content += "- **操作因素**：操作人员违规操作、操作人员缺乏设备维护知识、设备操作规程不清晰\n"
-                elif top_reason == "操作失误":
-                    report_content += "#### 操作失误可能因素分析\n"
-                    report_content += "- **人员培训**：新员工培训不足、定期技能培训缺失、操作考核不严格\n"
-                    report_content += "- **工作环境**：工作强度过大、工作环境嘈杂、照明条件不佳\n"
-                    report_content += "- **管理因素**：操作流程不清晰、质量控制点设置不合理、现场管理不到位\n"
-                else:
-                    report_content += "#### 其他不良原因分析\n"
-                    report_content += "- 建议对不合格产品进行详细检测，包括外观、尺寸、性能等方面\n"
-                    report_content += "- 进行鱼骨图分析或5W1H分析法，找出具体原因\n"
-                    report_content += "- 对生产过程进行全面排查，包括原材料、设备、工艺、人员等环节\n"
-            else:
-                report_content += "### 三、质量情况\n"
-                report_content += "本月生产的产品全部合格，未发现不合格产品\n"
-            
-            # 优化建议
-            report_content += "\n### 五、改善方案\n"
-            
-            # 根据主要问题提供详细的改善方案
-            if all_month_reasons:
-                if top_reason == "外观缺陷":
-                    report_content += "#### 外观缺陷改善方案\n"
-                    report_content += "1. **原材料管控**：\n"
-                    report_content += "   - 建立原材料批次检测制度，严格控制原材料外观质量\n"
-                    report_content += "   - 与供应商签订外观质量协议，明确色差、杂质等要求\n"
-                    report_content += "   - 对原材料存储环境进行控制，避免受潮、污染\n"
-                    report_content += "2. **生产环境优化**：\n"
-                    report_content += "   - 安装温湿度监控系统，确保生产环境符合工艺要求\n"
-                    report_content += "   - 加强车间清洁管理，减少粉尘污染\n"
-                    report_content += "   - 优化车间照明，确保质量检查光线充足\n"
-                    report_content += "3. **工艺优化**：\n"
-                    report_content += "   - 重新调整注塑温度、压力、速度参数，记录最优参数组合\n"
-                    report_content += "   - 建立模具温度控制系统，确保温度稳定\n"
-                    report_content += "   - 规范脱模剂使用，避免残留影响外观\n"
-                    report_content += "4. **设备维护**：\n"
-                    report_content += "   - 定期检查和抛光模具表面，延长模具寿命\n"
-                    report_content += "   - 对设备进行振动检测，及时调整设备水平\n"
-                elif top_reason == "尺寸偏差":
-                    report_content += "#### 尺寸偏差改善方案\n"
-                    report_content += "1. **设备精度保障**：\n"
-                    report_content += "   - 建立设备定期校准制度，每季度校准一次关键设备\n"
-                    report_content += "   - 安装设备精度监控系统，实时监测设备状态\n"
-                    report_content += "   - 对老化设备进行升级改造或更换\n"
-                    report_content += "2. **模具管理**：\n"
-                    report_content += "   - 建立模具定期检查制度，记录模具磨损情况\n"
-                    report_content += "   - 对磨损模具进行修复或更换\n"
-                    report_content += "   - 优化模具冷却系统，确保冷却均匀\n"
-                    report_content += "3. **原材料控制**：\n"
-                    report_content += "   - 对每批次原材料进行收缩率测试\n"
-                    report_content += "   - 控制原材料存储环境，避免含水率变化\n"
-                    report_content += "4. **工艺参数优化**：\n"
-                    report_content += "   - 进行DOE实验，找出最优工艺参数组合\n"
-                    report_content += "   - 建立工艺参数自动控制系统，减少人为误差\n"
-                    report_content += "5. **操作规范**：\n"
-                    report_content += "   - 制定详细的操作指导书，规范装夹定位方法\n"
-                    report_content += "   - 对操作人员进行测量技能培训，确保测量准确性\n"
-                elif top_reason == "性能不达标":
-                    report_content += "#### 性能不达标改善方案\n"
-                    report_content += "1. **材料配方优化**：\n"
-                    report_content += "   - 重新调整材料配方，进行性能测试验证\n"
-                    report_content += "   - 选择稳定性更好的原材料供应商\n"
-                    report_content += "2. **工艺参数调整**：\n"
-                    report_content += "   - 延长固化时间，确保产品完全固化\n"
-                    report_content += "   - 优化热处理工艺参数，提高产品性能\n"
-                    report_content += "3. **设备管理**：\n"
-                    report_content += "   - 对设备进行全面维护和校准\n"
-                    report_content += "   - 安装设备状态监控系统，及时发现设备故障\n"
-                    report_content += "4. **测试系统优化**：\n"
-                    report_content += "   - 定期校准测试设备\n"
-                    report_content += "   - 优化测试方法，确保测试结果准确\n"
-                elif top_reason == "材料问题":
-                    report_content += "#### 材料问题改善方案\n"
-                    report_content += "1. **供应商管理**：\n"
-                    report_content += "   - 建立供应商评估体系，定期对供应商进行审核\n"
-                    report_content += "   - 与核心供应商建立长期合作关系，签订质量协议\n"
-                    report_content += "   - 增加备用供应商，避免单一供应商风险\n"
-                    report_content += "2. **原材料存储**：\n"
-                    report_content += "   - 建立原材料存储管理制度，明确存储条件\n"
-                    report_content += "   - 对存储环境进行温湿度监控\n"
-                    report_content += "   - 实施先进先出制度，避免原材料过期\n"
-                    report_content += "3. **原材料检测**：\n"
-                    report_content += "   - 增加原材料检测项目，建立全检制度\n"
-                    report_content += "   - 使用先进检测设备，提高检测准确性\n"
-                elif top_reason == "工艺问题":
-                    report_content += "#### 工艺问题改善方案\n"
-                    report_content += "1. **工艺文件完善**：\n"
-                    report_content += "   - 重新修订工艺文件，明确各工序参数要求\n"
-                    report_content += "   - 增加工艺流程图，提高工艺可视化\n"
-                    report_content += "2. **工艺执行管控**：\n"
-                    report_content += "   - 建立工艺参数记录系统，实时监控工艺执行情况\n"
-                    report_content += "   - 定期进行工艺审核，确保工艺执行到位\n"
-                    report_content += "3. **工艺培训**：\n"
-                    report_content += "   - 对员工进行工艺文件培训，确保理解工艺要求\n"
-                    report_content += "   - 定期组织工艺知识考试，提高员工工艺意识\n"
-                elif top_reason == "设备故障":
-                    report_content += "#### 设备故障改善方案\n"
-                    report_content += "1. **设备维护计划**：\n"
-                    report_content += "   - 建立设备维护保养制度，明确维护项目和周期\n"
-                    report_content += "   - 制定设备维护计划，确保维护工作按时完成\n"
-                    report_content += "2. **设备状态监控**：\n"
-                    report_content += "   - 安装设备状态监控系统，实时监测设备运行参数\n"
-                    report_content += "   - 建立设备故障预警机制，提前发现潜在问题\n"
-                    report_content += "3. **设备操作培训**：\n"
-                    report_content += "   - 对操作人员进行设备操作培训，确保正确操作\n"
-                    report_content += "   - 制定设备操作规程，明确操作步骤和注意事项\n"
-                elif top_reason == "操作失误":
-                    report_content += "#### 操作失误改善方案\n"
-                    report_content += "1. **人员培训**：\n"
-                    report_content += "   - 建立新员工培训制度，培训合格后方可上岗\n"
-                    report_content += "   - 定期组织技能培训，提高员工操作水平\n"
-                    report_content += "   - 开展岗位技能竞赛，激励员工提高技能\n"
-                    report_content += "2. **工作环境优化**：\n"
-                    report_content += "   - 合理安排工作时间，避免员工疲劳作业\n"
-                    report_content += "   - 优化车间布局，减少噪音污染\n"
-                    report_content += "   - 改善工作照明，提高工作舒适度\n"
-                    report_content += "3. **管理提升**：\n"
-                    report_content += "   - 制定详细的操作指导书，明确操作流程\n"
-                    report_content += "   - 建立质量责任追溯制度，明确各岗位责任\n"
-                    report_content += "   - 加强现场管理，及时纠正违规操作\n"
+                # 根据主要问题提供详细的改善方案
+                if not reason_counts.empty:
+                    if top_reason == "外观缺陷":
+                        report_content += "#### 外观缺陷改善方案\n"
+                        report_content += "1. **原材料管控**：\n"
+                        report_content += "   - 建立原材料批次检测制度，严格控制原材料外观质量\n"
+                        report_content += "   - 与供应商签订外观质量协议，明确色差、杂质等要求\n"
+                        report_content += "   - 对原材料存储环境进行控制，避免受潮、污染\n"
+                        report_content += "2. **生产环境优化**：\n"
+                        report_content += "   - 安装温湿度监控系统，确保生产环境符合工艺要求\n"
+                        report_content += "   - 加强车间清洁管理，减少粉尘污染\n"
+                        report_content += "   - 优化车间照明，确保质量检查光线充足\n"
+                        report_content += "3. **工艺优化**：\n"
+                        report_content += "   - 重新调整注塑温度、压力、速度参数，记录最优参数组合\n"
+                        report_content += "   - 建立模具温度控制系统，确保温度稳定\n"
+                        report_content += "   - 规范脱模剂使用，避免残留影响外观\n"
+                        report_content += "4. **设备维护**：\n"
+                        report_content += "   - 定期检查和抛光模具表面，延长模具寿命\n"
+                        report_content += "   - 对设备进行振动检测，及时调整设备水平\n"
+                    elif top_reason == "尺寸偏差":
+                        report_content += "#### 尺寸偏差改善方案\n"
+                        report_content += "1. **设备精度保障**：\n"
+                        report_content += "   - 建立设备定期校准制度，每季度校准一次关键设备\n"
+                        report_content += "   - 安装设备精度监控系统，实时监测设备状态\n"
+                        report_content += "   - 对老化设备进行升级改造或更换\n"
+                        report_content += "2. **模具管理**：\n"
+                        report_content += "   - 建立模具定期检查制度，记录模具磨损情况\n"
+                        report_content += "   - 对磨损模具进行修复或更换\n"
+                        report_content += "   - 优化模具冷却系统，确保冷却均匀\n"
+                        report_content += "3. **原材料控制**：\n"
+                        report_content += "   - 对每批次原材料进行收缩率测试\n"
+                        report_content += "   - 控制原材料存储环境，避免含水率变化\n"
+                        report_content += "4. **工艺参数优化**：\n"
+                        report_content += "   - 进行DOE实验，找出最优工艺参数组合\n"
+                        report_content += "   - 建立工艺参数自动控制系统，减少人为误差\n"
+                        report_content += "5. **操作规范**：\n"
+                        report_content += "   - 制定详细的操作指导书，规范装夹定位方法\n"
+                        report_content += "   - 对操作人员进行测量技能培训，确保测量准确性\n"
+                    elif top_reason == "性能不达标":
+                        report_content += "#### 性能不达标改善方案\n"
+                        report_content += "1. **材料配方优化**：\n"
+                        report_content += "   - 重新调整材料配方，进行性能测试验证\n"
+                        report_content += "   - 选择稳定性更好的原材料供应商\n"
+                        report_content += "2. **工艺参数调整**：\n"
+                        report_content += "   - 延长固化时间，确保产品完全固化\n"
+                        report_content += "   - 优化热处理工艺参数，提高产品性能\n"
+                        report_content += "3. **设备管理**：\n"
+                        report_content += "   - 对设备进行全面维护和校准\n"
+                        report_content += "   - 安装设备状态监控系统，及时发现设备故障\n"
+                        report_content += "4. **测试系统优化**：\n"
+                        report_content += "   - 定期校准测试设备\n"
+                        report_content += "   - 优化测试方法，确保测试结果准确\n"
+                    elif top_reason == "材料问题":
+                        report_content += "#### 材料问题改善方案\n"
+                        report_content += "1. **供应商管理**：\n"
+                        report_content += "   - 建立供应商评估体系，定期对供应商进行审核\n"
+                        report_content += "   - 与核心供应商建立长期合作关系，签订质量协议\n"
+                        report_content += "   - 增加备用供应商，避免单一供应商风险\n"
+                        report_content += "2. **原材料存储**：\n"
+                        report_content += "   - 建立原材料存储管理制度，明确存储条件\n"
+                        report_content += "   - 对存储环境进行温湿度监控\n"
+                        report_content += "   - 实施先进先出制度，避免原材料过期\n"
+                        report_content += "3. **原材料检测**：\n"
+                        report_content += "   - 增加原材料检测项目，建立全检制度\n"
+                        report_content += "   - 使用先进检测设备，提高检测准确性\n"
+                    elif top_reason == "工艺问题":
+                        report_content += "#### 工艺问题改善方案\n"
+                        report_content += "1. **工艺文件完善**：\n"
+                        report_content += "   - 重新修订工艺文件，明确各工序参数要求\n"
+                        report_content += "   - 增加工艺流程图，提高工艺可视化\n"
+                        report_content += "2. **工艺执行管控**：\n"
+                        report_content += "   - 建立工艺参数记录系统，实时监控工艺执行情况\n"
+                        report_content += "   - 定期进行工艺审核，确保工艺执行到位\n"
+                        report_content += "3. **工艺培训**：\n"
+                        report_content += "   - 对员工进行工艺文件培训，确保理解工艺要求\n"
+                        report_content += "   - 定期组织工艺知识考试，提高员工工艺意识\n"
+                    elif top_reason == "设备故障":
+                        report_content += "#### 设备故障改善方案\n"
+                        report_content += "1. **设备维护计划**：\n"
+                        report_content += "   - 建立设备维护保养制度，明确维护项目和周期\n"
+                        report_content += "   - 制定设备维护计划，确保维护工作按时完成\n"
+                        report_content += "2. **设备状态监控**：\n"
+                        report_content += "   - 安装设备状态监控系统，实时监测设备运行参数\n"
+                        report_content += "   - 建立设备故障预警机制，提前发现潜在问题\n"
+                        report_content += "3. **设备操作培训**：\n"
+                        report_content += "   - 对操作人员进行设备操作培训，确保正确操作\n"
+                        report_content += "   - 制定设备操作规程，明确操作步骤和注意事项\n"
+                    elif top_reason == "操作失误":
+                        report_content += "#### 操作失误改善方案\n"
+                        report_content += "1. **人员培训**：\n"
+                        report_content += "   - 建立新员工培训制度，培训合格后方可上岗\n"
+                        report_content += "   - 定期组织技能培训，提高员工操作水平\n"
+                        report_content += "   - 开展岗位技能竞赛，激励员工提高技能\n"
+                        report_content += "2. **工作环境优化**：\n"
+                        report_content += "   - 合理安排工作时间，避免员工疲劳作业\n"
+                        report_content += "   - 优化车间布局，减少噪音污染\n"
+                        report_content += "   - 改善工作照明，提高工作舒适度\n"
+                        report_content += "3. **管理提升**：\n"
+                        report_content += "   - 制定详细的操作指导书，明确操作流程\n"
+                        report_content += "   - 建立质量责任追溯制度，明确各岗位责任\n"
+                        report_content += "   - 加强现场管理，及时纠正违规操作\n"
+                    else:
+                        report_content += "#### 其他不良情况改善方案\n"
+                        report_content += "1. 组织跨部门质量分析会议，找出具体不良原因\n"
+                        report_content += "2. 建立临时质量改进小组，制定专项改善计划\n"
+                        report_content += "3. 增加产品检测项目，全面了解产品质量状况\n"
+                        report_content += "4. 对生产过程进行全面排查，找出问题点\n"
                 else:
-                    report_content += "#### 其他不良情况改善方案\n"
-                    report_content += "1. 组织跨部门质量分析会议，找出具体不良原因\n"
-                    report_content += "2. 建立临时质量改进小组，制定专项改善计划\n"
-                    report_content += "3. 增加产品检测项目，全面了解产品质量状况\n"
-                    report_content += "4. 对生产过程进行全面排查，找出问题点\n"
-            else:
-                report_content += "#### 质量保持与提升方案\n"
-                report_content += "1. 保持当前的生产和质量控制水平\n"
-                report_content += "2. 定期进行工艺优化和设备维护\n"
-                report_content += "3. 持续关注员工技能提升\n"
-                report_content += "4. 建立质量预警机制，提前发现潜在质量问题\n"
-                report_content += "5. 定期进行质量回顾，总结经验教训\n"
-            
-            # 月度产品曲线分析图
-            st.markdown("### 月度产品曲线分析")
-            
-            if not month_data.empty:
-                # 按日期排序
-                month_data_sorted = month_data.sort_values("日期")
-                
-                # 创建月度生产趋势图
-                fig_month_trend = go.Figure()
-                fig_month_trend.add_trace(go.Scatter(
-                    x=month_data_sorted["日期"],
-                    y=month_data_sorted["生产数量"],
-                    name="生产数量",
-                    mode="lines+markers",
-                    line=dict(color="#2196F3", width=2)
-                ))
-                fig_month_trend.add_trace(go.Scatter(
-                    x=month_data_sorted["日期"],
-                    y=month_data_sorted["合格数量"],
-                    name="合格数量",
-                    mode="lines+markers",
-                    line=dict(color="#4CAF50", width=2)
-                ))
-                fig_month_trend.add_trace(go.Scatter(
-                    x=month_data_sorted["日期"],
-                    y=month_data_sorted["不合格数量"],
-                    name="不合格数量",
-                    mode="lines+markers",
-                    line=dict(color="#F44336", width=2)
-                ))
+                    report_content += "#### 质量保持与提升方案\n"
+                    report_content += "1. 保持当前的生产和质量控制水平\n"
+                    report_content += "2. 定期进行工艺优化和设备维护\n"
+                    report_content += "3. 持续关注员工技能提升\n"
+                    report_content += "4. 建立质量预警机制，提前发现潜在质量问题\n"
+                    report_content += "5. 定期进行质量回顾，总结经验教训\n"
                 
-                fig_month_trend.update_layout(
-                    title=f"{selected_month} 每日生产情况趋势",
-                    xaxis_title="日期",
-                    yaxis_title="数量",
-                    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-                    template="plotly_white",
-                    font=dict(color="#000000"),
-                    xaxis=dict(title_font=dict(color="#000000"), tickfont=dict(color="#000000")),
-                    yaxis=dict(title_font=dict(color="#000000"), tickfont=dict(color="#000000")),
-                    legend_font=dict(color="#000000")
-                )
-                
-                st.plotly_chart(fig_month_trend, use_container_width=True)
-            else:
-                st.info("暂无月度数据生成趋势图")
-            
-            # 绘制质量趋势折线图
-            st.markdown("### 质量趋势分析")
-            
-            # 检查是否有数据
-            if not st.session_state.production_data.empty:
-                # 获取所有月份数据并按月份排序
-                all_months = st.session_state.production_data["日期"].dt.strftime("%Y-%m").unique()
-                all_months = sorted(all_months)
-                
-                # 计算每个月的合格率
-                month_pass_rates = []
-                for month in all_months:
-                    month_data_temp = st.session_state.production_data[
-                        st.session_state.production_data["日期"].dt.strftime("%Y-%m") == month
-                    ]
-                    if not month_data_temp.empty:
-                        total_production = month_data_temp["生产数量"].sum()
-                        total_qualified = month_data_temp["合格数量"].sum()
-                        if total_production > 0:
-                            pass_rate = (total_qualified / total_production) * 100
-                            month_pass_rates.append({
-                                "月份": month,
-                                "合格率": pass_rate,
-                                "生产数量": total_production
-                            })
+                # 月度产品曲线分析图
+                st.markdown("### 月度产品曲线分析")
                 
-                if month_pass_rates:
-                    trend_df = pd.DataFrame(month_pass_rates)
+                if not month_data.empty:
+                    # 从每日汇总表读取当月数据，按天汇总
+                    month_data_sorted = rollup_series(query_daily_rollup(start_date=month_start, end_date=month_end), 'day')
                     
-                    fig_trend = px.line(
-                        trend_df,
-                        x="月份",
-                        y="合格率",
-                        title="近月产品合格率趋势",
-                        markers=True,
-                        template="plotly_white",
-                        hover_data={"生产数量": True, "合格率": ":.2f%%"}
-                    )
+                    # 创建月度生产趋势图
+                    fig_month_trend = go.Figure()
+                    fig_month_trend.add_trace(go.Scatter(
+                        x=month_data_sorted["日期"],
+                        y=month_data_sorted["生产数量"],
+                        name="生产数量",
+                        mode="lines+markers",
+                        line=dict(color="#2196F3", width=2)
+                    ))
+                    fig_month_trend.add_trace(go.Scatter(
+                        x=month_data_sorted["日期"],
+                        y=month_data_sorted["合格数量"],
+                        name="合格数量",
+                        mode="lines+markers",
+                        line=dict(color="#4CAF50", width=2)
+                    ))
+                    fig_month_trend.add_trace(go.Scatter(
+                        x=month_data_sorted["日期"],
+                        y=month_data_sorted["不合格数量"],
+                        name="不合格数量",
+                        mode="lines+markers",
+                        line=dict(color="#F44336", width=2)
+                    ))
                     
-                    fig_trend.update_layout(
-                        yaxis=dict(
-                            title="合格率 (%)",
-                            range=[0, 100],
-                            tickformat=".0f"
-                        ),
-                        xaxis=dict(
-                            title="月份"
-                        ),
+                    fig_month_trend.update_layout(
+                        title=f"{selected_month} 每日生产情况趋势",
+                        xaxis_title="日期",
+                        yaxis_title="数量",
+                        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+                        template="plotly_white",
                         font=dict(color="#000000"),
-                        xaxis_title_font=dict(color="#000000"),
-                        yaxis_title_font=dict(color="#000000"),
+                        xaxis=dict(title_font=dict(color="#000000"), tickfont=dict(color="#000000")),
+                        yaxis=dict(title_font=dict(color="#000000"), tickfont=dict(color="#000000")),
                         legend_font=dict(color="#000000")
                     )
                     
-                    st.plotly_chart(fig_trend, use_container_width=True)
+                    st.plotly_chart(fig_month_trend, use_container_width=True)
                 else:
-                    st.info("暂无足够数据生成质量趋势图")
-            else:
-                st.info("暂无数据生成质量趋势图")
-            
-            # 显示报告
-            st.text_area("月度报告", report_content, height=500)
-            
-            # 下载月度数据
-            st.markdown(
-                get_csv_download_link(
-                    month_data,
+                    st.info("暂无月度数据生成趋势图")
+                
+                # 绘制质量趋势折线图
+                st.markdown("### 质量趋势分析")
+                
+                # 检查是否有数据
+                if not month_totals.empty:
+                    trend_granularity = st.selectbox("汇总粒度", list(ROLLUP_GRANULARITIES), index=2, key="quality_trend_granularity")
+                    
+                    # 由每日汇总表一次汇总出所选粒度的合格率
+                    trend_df = rollup_series(query_daily_rollup(), ROLLUP_GRANULARITIES[trend_granularity])
+                    trend_df = trend_df[trend_df["生产数量"] > 0]
+                    
+                    if not trend_df.empty:
+                        
+                        fig_trend = px.line(
+                            trend_df,
+                            x="周期",
+                            y="合格率",
+                            title=f"产品合格率趋势（按{trend_granularity}）",
+                            markers=True,
+                            template="plotly_white",
+                            hover_data={"生产数量": True, "合格率": ":.2f%%"}
+                        )
+                        
+                        fig_trend.update_layout(
+                            yaxis=dict(
+                                title="合格率 (%)",
+                                range=[0, 100],
+                                tickformat=".0f"
+                            ),
+                            xaxis=dict(
+                                title="周期"
+                            ),
+                            font=dict(color="#000000"),
+                            xaxis_title_font=dict(color="#000000"),
+                            yaxis_title_font=dict(color="#000000"),
+                            legend_font=dict(color="#000000")
+                        )
+                        
+                        st.plotly_chart(fig_trend, use_container_width=True)
+                    else:
+                        st.info("暂无足够数据生成质量趋势图")
+                else:
+                    st.info("暂无数据生成质量趋势图")
+                
+                # 显示报告
+                st.text_area("月度报告", report_content, height=500)
+                
+                # 下载月度数据
+                csv_download_button(
+                    "📥 下载月度生产数据",
                     f"{selected_month}_production_data.csv",
-                    "📥 下载月度生产数据"
-                ),
-                unsafe_allow_html=True
-            )
+                    key="month_data_download",
+                    start_date=month_start,
+                    end_date=month_end
+                )
+        
+        month_report_fragment(month_totals)
+        
         # 智能优化建议
         st.markdown("---")
         st.subheader("💡 智能优化建议")
         
         # 为每个产品生成优化建议
-        all_products = st.session_state.production_data["产品名称"].unique()
+        all_products = load_product_names()
+        
+        # 从月度汇总表一次性读取所有产品的月度数据
+        all_monthly_rollup = query_monthly_rollup()
+        
+        # 按产品分区的行索引，逐个产品取数据时不再对整表做比较
+        product_partitions = get_product_partitions(st.session_state.production_data)
+        monthly_partitions = build_product_partitions(all_monthly_rollup)
         
         for product in all_products:
             st.markdown(f"#### 📦 {product} 优化建议与市场评估")
             
             # 获取该产品的历史数据
-            product_data = st.session_state.production_data[
-                st.session_state.production_data["产品名称"] == product
-            ]
+            product_data = product_rows(st.session_state.production_data, product_partitions, product)
             
             if not product_data.empty:
+                # 按月份汇总生产数量（读取月度汇总表，补齐没有生产的月份）
+                monthly_production = fill_missing_months(
+                    product_rows(all_monthly_rollup, monthly_partitions, product)
+                )
+                
                 # 计算关键指标
-                total_production = product_data["生产数量"].sum()
-                total_qualified = product_data["合格数量"].sum()
-                total_unqualified = product_data["不合格数量"].sum()
+                total_production = monthly_production["生产数量"].sum()
+                total_qualified = monthly_production["合格数量"].sum()
+                total_unqualified = monthly_production["不合格数量"].sum()
                 pass_rate = (total_qualified / total_production) * 100 if total_production > 0 else 0
                 
-                # 按月份汇总生产数量
-                monthly_production = product_data.resample('M', on='日期').sum()[["生产数量"]]
-                monthly_production = monthly_production.reset_index()
-                
                 # 分析市场需求趋势（基于生产数量变化）
                 market_trend = "稳定"
                 if len(monthly_production) >= 3:
@@ -1312,13 +2407,9 @@ elif selected == "分析报告":
                     optimization_suggestions.append("维持当前生产规模，密切关注市场变化")
                 
                 # 基于不合格原因的建议
-                all_reasons = []
-                for reasons in product_data["不合格原因"]:
-                    if reasons and reasons != "无":
-                        all_reasons.extend([reason.strip() for reason in reasons.split(",")])
+                reason_counts = count_defect_reasons(product_data.index)
                 
-                if all_reasons:
-                    reason_counts = pd.Series(all_reasons).value_counts()
+                if not reason_counts.empty:
                     top_reason = reason_counts.idxmax()
                     
                     if top_reason == "外观缺陷":
@@ -1367,112 +2458,115 @@ elif selected == "分析报告":
             else:
                 st.info(f"{product} 暂无数据")
         
-        # 备货数量预测分析
-        st.markdown("---")
-        st.subheader("📈 备货数量预测分析")
-        
-        # 选择产品进行预测
-        all_products = st.session_state.production_data["产品名称"].unique()
-        selected_product_for_prediction = st.selectbox("选择产品进行备货预测", all_products, key="prediction_product_select")
+        # 备货数量预测分析（独立片段：切换产品时只重新运行本片段）
+        @st.fragment
+        def stock_forecast_fragment(all_products):
+            st.markdown("---")
+            st.subheader("📈 备货数量预测分析")
+            
+            # 选择产品进行预测
+            selected_product_for_prediction = st.selectbox("选择产品进行备货预测", all_products, key="prediction_product_select")
+            
+            # 从月度汇总表获取该产品的历史生产数据
+            product_history = query_monthly_rollup(products=[selected_product_for_prediction])
+            
+            if product_history["记录数"].sum() >= 2:  # 需要至少2个月的数据进行预测
+                # 按月份汇总生产数量（补齐没有生产的月份）
+                monthly_production = fill_missing_months(product_history)
+                monthly_production["日期"] = pd.PeriodIndex(monthly_production["月份"], freq="M").to_timestamp()
+                
+                # 使用移动平均法预测下一个月的生产数量
+                predicted_production = monthly_production["生产数量"].mean()
+                
+                # 计算下一个月的日期
+                last_date = monthly_production["日期"].max()
+                if last_date.month == 12:
+                    next_month_date = datetime(last_date.year + 1, 1, 1)
+                else:
+                    next_month_date = datetime(last_date.year, last_date.month + 1, 1)
+                
+                # 显示预测结果
+                st.markdown(f"#### {selected_product_for_prediction} 下一个月备货数量预测")
+                
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.markdown('<div class="metric-card">', unsafe_allow_html=True)
+                    st.metric("预测月份", next_month_date.strftime("%Y-%m"))
+                    st.markdown('</div>', unsafe_allow_html=True)
+                
+                with col2:
+                    st.markdown('<div class="metric-card">', unsafe_allow_html=True)
+                    st.metric("预测备货数量", f"{int(round(predicted_production)):,}")
+                    st.markdown('</div>', unsafe_allow_html=True)
+                
+                with col3:
+                    st.markdown('<div class="metric-card">', unsafe_allow_html=True)
+                    avg_production = monthly_production["生产数量"].mean()
+                    st.metric("历史月均生产数量", f"{int(round(avg_production)):,}")
+                    st.markdown('</div>', unsafe_allow_html=True)
+                
+                # 绘制历史生产与预测数量趋势图
+                fig_prediction = go.Figure()
+                
+                # 添加历史数据
+                fig_prediction.add_trace(go.Scatter(
+                    x=monthly_production["日期"],
+                    y=monthly_production["生产数量"],
+                    name="历史生产数量",
+                    mode="lines+markers",
+                    line=dict(color="#2196F3", width=2)
+                ))
+                
+                # 添加预测数据
+                fig_prediction.add_trace(go.Scatter(
+                    x=[next_month_date],
+                    y=[predicted_production],
+                    name="预测备货数量",
+                    mode="markers",
+                    marker=dict(color="#FF9800", size=15, symbol="star")
+                ))
+                
+                fig_prediction.update_layout(
+                    title=f"{selected_product_for_prediction} 生产数量历史趋势与预测",
+                    xaxis_title="日期",
+                    yaxis_title="数量",
+                    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+                    template="plotly_white",
+                    font=dict(color="#000000"),
+                    xaxis=dict(title_font=dict(color="#000000"), tickfont=dict(color="#000000")),
+                    yaxis=dict(title_font=dict(color="#000000"), tickfont=dict(color="#000000")),
+                    legend_font=dict(color="#000000")
+                )
+                
+                st.plotly_chart(fig_prediction, use_container_width=True)
+                
+                # 显示预测说明
+                st.markdown("### 预测说明")
+                st.markdown("- 预测基于历史生产数据的线性回归模型")
+                st.markdown("- 建议结合实际市场需求和库存情况调整备货数量")
+                st.markdown("- 模型预测准确率受历史数据量和稳定性影响")
+                
+            else:
+                st.info(f"{selected_product_for_prediction} 数据不足，需要至少2个月的生产数据才能进行预测")
         
-        # 获取该产品的历史生产数据
-        product_history = st.session_state.production_data[
-            st.session_state.production_data["产品名称"] == selected_product_for_prediction
-        ].sort_values("日期")
+        stock_forecast_fragment(all_products)
         
-        if len(product_history) >= 2:  # 需要至少2个月的数据进行预测
-            # 按月份汇总生产数量
-            monthly_production = product_history.resample('M', on='日期').sum()[["生产数量"]]
-            monthly_production = monthly_production.reset_index()
-            monthly_production["月份"] = monthly_production["日期"].dt.month
-            monthly_production["年份"] = monthly_production["日期"].dt.year
-            
-            # 使用移动平均法预测下一个月的生产数量
-            predicted_production = monthly_production["生产数量"].mean()
-            
-            # 计算下一个月的日期
-            last_date = monthly_production["日期"].max()
-            if last_date.month == 12:
-                next_month_date = datetime(last_date.year + 1, 1, 1)
-            else:
-                next_month_date = datetime(last_date.year, last_date.month + 1, 1)
-            
-            # 显示预测结果
-            st.markdown(f"#### {selected_product_for_prediction} 下一个月备货数量预测")
-            
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-                st.metric("预测月份", next_month_date.strftime("%Y-%m"))
-                st.markdown('</div>', unsafe_allow_html=True)
-            
-            with col2:
-                st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-                st.metric("预测备货数量", f"{int(round(predicted_production)):,}")
-                st.markdown('</div>', unsafe_allow_html=True)
-            
-            with col3:
-                st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-                avg_production = monthly_production["生产数量"].mean()
-                st.metric("历史月均生产数量", f"{int(round(avg_production)):,}")
-                st.markdown('</div>', unsafe_allow_html=True)
-            
-            # 绘制历史生产与预测数量趋势图
-            fig_prediction = go.Figure()
-            
-            # 添加历史数据
-            fig_prediction.add_trace(go.Scatter(
-                x=monthly_production["日期"],
-                y=monthly_production["生产数量"],
-                name="历史生产数量",
-                mode="lines+markers",
-                line=dict(color="#2196F3", width=2)
-            ))
-            
-            # 添加预测数据
-            fig_prediction.add_trace(go.Scatter(
-                x=[next_month_date],
-                y=[predicted_production],
-                name="预测备货数量",
-                mode="markers",
-                marker=dict(color="#FF9800", size=15, symbol="star")
-            ))
-            
-            fig_prediction.update_layout(
-                title=f"{selected_product_for_prediction} 生产数量历史趋势与预测",
-                xaxis_title="日期",
-                yaxis_title="数量",
-                legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-                template="plotly_white",
-                font=dict(color="#000000"),
-                xaxis=dict(title_font=dict(color="#000000"), tickfont=dict(color="#000000")),
-                yaxis=dict(title_font=dict(color="#000000"), tickfont=dict(color="#000000")),
-                legend_font=dict(color="#000000")
-            )
-            
-            st.plotly_chart(fig_prediction, use_container_width=True)
-            
-            # 显示预测说明
-            st.markdown("### 预测说明")
-            st.markdown("- 预测基于历史生产数据的线性回归模型")
-            st.markdown("- 建议结合实际市场需求和库存情况调整备货数量")
-            st.markdown("- 模型预测准确率受历史数据量和稳定性影响")
-            
-        else:
-            st.info(f"{selected_product_for_prediction} 数据不足，需要至少2个月的生产数据才能进行预测")
-
 # 智能分析页面
 elif selected == "智能分析":
     st.title("🤖 智能分析系统")
     st.markdown("---")
     
-    # 智能分析功能选项卡
-    analysis_tab1, analysis_tab2, analysis_tab3, analysis_tab4, analysis_tab5, analysis_tab6 = st.tabs([
-        "质量分析引擎", "库存优化引擎", "智能决策引擎", "需求预测分析", "可视化仪表盘", "知识库"
-    ])
+    # 智能分析功能导航：只运行当前选中的视图，其余视图不参与本次运行
+    analysis_view = st.radio(
+        "分析功能",
+        ["质量分析引擎", "库存优化引擎", "智能决策引擎", "需求预测分析", "可视化仪表盘", "知识库"],
+        horizontal=True,
+        key="analysis_view",
+        label_visibility="collapsed"
+    )
     
     # 1. 质量分析引擎
-    with analysis_tab1:
+    if analysis_view == "质量分析引擎":
         st.subheader("📊 质量分析引擎")
         st.markdown("---")
         
@@ -1486,13 +2580,16 @@ elif selected == "智能分析":
                 # 不合格率分析
                 st.markdown("### 🔍 不合格率分析")
                 
+                # 从月度汇总表读取各产品汇总数据
+                quality_monthly_rollup = query_monthly_rollup()
+                
                 # 计算总体不合格率
-                total_production = st.session_state.production_data["生产数量"].sum()
-                total_unqualified = st.session_state.production_data["不合格数量"].sum()
+                total_production = quality_monthly_rollup["生产数量"].sum()
+                total_unqualified = quality_monthly_rollup["不合格数量"].sum()
                 overall_unqualified_rate = (total_unqualified / total_production * 100) if total_production > 0 else 0
                 
                 # 按产品计算不合格率
-                product_unqualified = st.session_state.production_data.groupby("产品名称").agg(
+                product_unqualified = quality_monthly_rollup.groupby("产品名称").agg(
                     生产总数=pd.NamedAgg(column="生产数量", aggfunc="sum"),
                     不合格总数=pd.NamedAgg(column="不合格数量", aggfunc="sum")
                 ).reset_index()
@@ -1517,50 +2614,53 @@ elif selected == "智能分析":
                 # 帕累托分析
                 st.markdown("### 📈 帕累托分析")
                 
-                # 解析所有不合格原因
-                all_reasons = []
-                for reasons in st.session_state.production_data["不合格原因"]:
-                    if reasons and reasons != "无":
-                        all_reasons.extend([reason.strip() for reason in reasons.split(",")])
+                # 各原因出现次数及累积百分比与筛选无关，按数据版本缓存（下方根本原因挖掘也使用）
+                pareto_version, pareto_source, _ = get_production_snapshot()
                 
-                if all_reasons:
-                    reason_df = pd.DataFrame(all_reasons, columns=["不合格原因"])
-                    reason_counts = reason_df["不合格原因"].value_counts().reset_index()
-                    reason_counts.columns = ["不合格原因", "次数"]
-                    
+                def build_pareto_counts():
+                    # 从同一版本的拆分视图统计各原因出现次数
+                    reason_counts = count_defect_reasons(reasons=load_shared_defect_reasons(pareto_version, pareto_source)).reset_index()
                     # 计算累积百分比
                     reason_counts["累计百分比"] = (reason_counts["次数"].cumsum() / reason_counts["次数"].sum() * 100).round(2)
-                    
-                    # 帕累托图
-                    fig_pareto = px.bar(
-                        reason_counts,
-                        x="不合格原因",
-                        y="次数",
-                        title="不合格原因帕累托分析",
-                        template="plotly_white",
-                        color="不合格原因"
-                    )
-                    
-                    # 添加累积百分比线
-                    fig_pareto.add_trace(go.Scatter(
-                        x=reason_counts["不合格原因"],
-                        y=reason_counts["累计百分比"],
-                        name="累积百分比",
-                        yaxis="y2",
-                        mode="lines+markers",
-                        line=dict(color="red", width=2)
-                    ))
-                    
-                    fig_pareto.update_layout(
-                        yaxis2=dict(
-                            title="累积百分比(%)",
-                            overlaying="y",
-                            side="right",
-                            range=[0, 100]
+                    return reason_counts
+                
+                reason_counts = cached_view("quality_reason_counts", {}, build_pareto_counts, pareto_version)
+                all_reasons = not reason_counts.empty
+                
+                if all_reasons:
+                    def build_pareto_figure():
+                        # 帕累托图
+                        fig_pareto = px.bar(
+                            reason_counts,
+                            x="不合格原因",
+                            y="次数",
+                            title="不合格原因帕累托分析",
+                            template="plotly_white",
+                            color="不合格原因"
                         )
-                    )
+                        
+                        # 添加累积百分比线
+                        fig_pareto.add_trace(go.Scatter(
+                            x=reason_counts["不合格原因"],
+                            y=reason_counts["累计百分比"],
+                            name="累积百分比",
+                            yaxis="y2",
+                            mode="lines+markers",
+                            line=dict(color="red", width=2)
+                        ))
+                        
+                        fig_pareto.update_layout(
+                            yaxis2=dict(
+                                title="累积百分比(%)",
+                                overlaying="y",
+                                side="right",
+                                range=[0, 100]
+                            )
+                        )
+                        
+                        return fig_pareto
                     
-                    st.plotly_chart(fig_pareto, use_container_width=True)
+                    st.plotly_chart(cached_view("quality_pareto", {}, build_pareto_figure, pareto_version), use_container_width=True)
                 else:
                     st.info("暂无不合格原因数据")
             
@@ -1603,7 +2703,7 @@ elif selected == "智能分析":
                 st.info("暂无不合格原因数据，无法进行根本原因挖掘")
     
     # 2. 库存优化引擎
-    with analysis_tab2:
+    elif analysis_view == "库存优化引擎":
         st.subheader("📦 库存优化引擎")
         st.markdown("---")
         
@@ -1757,7 +2857,7 @@ elif selected == "智能分析":
             st.plotly_chart(fig_service_level, use_container_width=True)
         
     # 3. 智能决策引擎
-    with analysis_tab3:
+    elif analysis_view == "智能决策引擎":
         st.subheader("🧠 智能决策引擎")
         st.markdown("---")
         
@@ -1990,520 +3090,555 @@ elif selected == "智能分析":
         st.markdown("6. **决策推荐**: 提供最优决策方案和执行建议")
         
     # 4. 需求预测分析
-    with analysis_tab4:
+    elif analysis_view == "需求预测分析":
         st.subheader("📅 需求预测分析")
         st.markdown("---")
         
-        # 数据准备与模型选择
-        col1, col2 = st.columns(2)
-        with col1:
-            st.markdown("### 🔧 预测设置")
-            product_for_forecast = st.selectbox("选择产品", st.session_state.production_data["产品名称"].unique(), key="forecast_product_select")
-            forecast_days = st.slider("预测天数", 7, 90, 30)
-            
-            # 多模型选择
-            selected_models = st.multiselect(
-                "选择预测模型",
-                ["线性回归", "移动平均", "指数平滑", "季节性ARIMA", "Prophet"],
-                default=["线性回归", "季节性ARIMA"]
-            )
-            
-        with col2:
-            st.markdown("### 📊 历史数据")
-            # 准备历史需求数据
-            product_data = st.session_state.production_data[st.session_state.production_data["产品名称"] == product_for_forecast]
-            
-            if len(product_data) < 7:
-                st.info("数据量不足，需要至少7天的历史数据进行预测")
-            else:
-                # 按日期聚合需求数据
-                daily_demand = product_data.groupby("日期")[["生产数量", "合格数量"]].sum().reset_index()
-                
-                # 计算日需求量（使用合格数量）
-                daily_demand["需求量"] = daily_demand["合格数量"]
-                
-                # 显示历史需求趋势图
-                fig_hist = go.Figure()
-                fig_hist.add_trace(go.Scatter(
-                    x=daily_demand["日期"],
-                    y=daily_demand["需求量"],
-                    mode='lines+markers',
-                    name='历史需求量',
-                    line=dict(color='#3b82f6')
-                ))
-                fig_hist.update_layout(
-                    title="历史需求趋势",
-                    xaxis_title="日期",
-                    yaxis_title="需求量",
-                    height=300,
-                    margin=dict(l=20, r=20, t=50, b=20)
+        # 需求预测面板（独立片段：调整预测设置时只重新运行本片段）
+        @st.fragment
+        def demand_forecast_fragment():
+            # 数据准备与模型选择
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown("### 🔧 预测设置")
+                product_for_forecast = st.selectbox("选择产品", load_product_names(), key="forecast_product_select")
+                forecast_days = st.slider("预测天数", 7, 90, 30)
+                
+                # 多模型选择
+                selected_models = st.multiselect(
+                    "选择预测模型",
+                    ["线性回归", "移动平均", "指数平滑", "季节性ARIMA", "Prophet"],
+                    default=["线性回归", "季节性ARIMA"]
                 )
-                st.plotly_chart(fig_hist, use_container_width=True)
-        
-        if len(product_data) >= 7:
-            # 需求预测执行
-            st.markdown("---")
-            st.markdown("### ⚡ 执行预测")
-            
-            if st.button("开始预测"):
-                # 数据预处理
-                from sklearn.preprocessing import MinMaxScaler
-                from sklearn.linear_model import LinearRegression
-                from sklearn.metrics import mean_absolute_error, mean_squared_error
-                import numpy as np
-                from statsmodels.tsa.seasonal import seasonal_decompose
-                
-                # 准备时间序列数据
-                time_series = daily_demand.set_index('日期')['需求量']
-                time_series = time_series.asfreq('D')
-                time_series = time_series.fillna(time_series.mean())
-                
-                # 创建预测结果容器
-                st.session_state.forecast_results = {}
-                
-                # 1. 线性回归预测
-                if "线性回归" in selected_models:
-                    # 特征工程：使用时间索引作为特征
-                    X = np.arange(len(time_series)).reshape(-1, 1)
-                    y = time_series.values
-                    
-                    # 训练模型
-                    lr_model = LinearRegression()
-                    lr_model.fit(X, y)
-                    
-                    # 预测未来值
-                    future_X = np.arange(len(time_series), len(time_series) + forecast_days).reshape(-1, 1)
-                    lr_forecast = lr_model.predict(future_X)
-                    
-                    # 保存结果
-                    st.session_state.forecast_results["线性回归"] = lr_forecast
-                
-                # 2. 移动平均预测
-                if "移动平均" in selected_models:
-                    window = 7  # 7天移动平均
-                    ma_forecast = []
-                    last_ma = time_series[-window:].mean()
-                    
-                    for _ in range(forecast_days):
-                        ma_forecast.append(last_ma)
-                        # 简单移动平均：保持最后一个平均值
-                    
-                    st.session_state.forecast_results["移动平均"] = np.array(ma_forecast)
-                
-                # 3. 指数平滑预测
-                if "指数平滑" in selected_models:
-                    alpha = 0.3  # 平滑系数
-                    es_forecast = []
-                    last_value = time_series.iloc[-1]
-                    
-                    for _ in range(forecast_days):
-                        es_forecast.append(last_value)
-                        # 简单指数平滑：保持最后一个预测值（更复杂的实现需要考虑趋势和季节性）
-                    
-                    st.session_state.forecast_results["指数平滑"] = np.array(es_forecast)
-                
-                # 4. 季节性ARIMA预测（简化版）
-                if "季节性ARIMA" in selected_models:
-                    try:
-                        from statsmodels.tsa.arima.model import ARIMA
-                        
-                        # 简化的ARIMA模型
-                        model = ARIMA(time_series, order=(1, 1, 1))
-                        arima_result = model.fit()
-                        
-                        # 预测
-                        arima_forecast = arima_result.forecast(steps=forecast_days)
-                        st.session_state.forecast_results["季节性ARIMA"] = arima_forecast.values
-                    except Exception as e:
-                        st.error(f"ARIMA模型预测出错：{e}")
-                
-                # 5. Prophet预测（简化版）
-                if "Prophet" in selected_models:
-                    try:
-                        # 简化的Prophet实现（这里使用线性回归模拟）
-                        # 完整实现需要安装fbprophet库
+                
+            with col2:
+                st.markdown("### 📊 历史数据")
+                # 准备历史需求数据（从每日汇总表读取，每行为一天）
+                product_data = query_daily_rollup(products=[product_for_forecast])
+                
+                if len(product_data) < 7:
+                    st.info("数据量不足，需要至少7天的历史数据进行预测")
+                else:
+                    # 按日期聚合需求数据
+                    daily_demand = rollup_series(product_data, 'day')
+                    
+                    # 计算日需求量（使用合格数量）
+                    daily_demand["需求量"] = daily_demand["合格数量"]
+                    
+                    # 显示历史需求趋势图
+                    fig_hist = go.Figure()
+                    fig_hist.add_trace(go.Scatter(
+                        x=daily_demand["日期"],
+                        y=daily_demand["需求量"],
+                        mode='lines+markers',
+                        name='历史需求量',
+                        line=dict(color='#3b82f6')
+                    ))
+                    fig_hist.update_layout(
+                        title="历史需求趋势",
+                        xaxis_title="日期",
+                        yaxis_title="需求量",
+                        height=300,
+                        margin=dict(l=20, r=20, t=50, b=20)
+                    )
+                    st.plotly_chart(fig_hist, use_container_width=True)
+            
+            if len(product_data) >= 7:
+                # 需求预测执行
+                st.markdown("---")
+                st.markdown("### ⚡ 执行预测")
+                
+                if st.button("开始预测"):
+                    # 数据预处理
+                    from sklearn.preprocessing import MinMaxScaler
+                    from sklearn.linear_model import LinearRegression
+                    from sklearn.metrics import mean_absolute_error, mean_squared_error
+                    import numpy as np
+                    from statsmodels.tsa.seasonal import seasonal_decompose
+                    
+                    # 准备时间序列数据
+                    time_series = daily_demand.set_index('日期')['需求量']
+                    time_series = time_series.asfreq('D')
+                    time_series = time_series.fillna(time_series.mean())
+                    
+                    # 创建预测结果容器
+                    st.session_state.forecast_results = {}
+                    
+                    # 1. 线性回归预测
+                    if "线性回归" in selected_models:
+                        # 特征工程：使用时间索引作为特征
                         X = np.arange(len(time_series)).reshape(-1, 1)
                         y = time_series.values
                         
-                        prophet_model = LinearRegression()
-                        prophet_model.fit(X, y)
+                        # 训练模型
+                        lr_model = LinearRegression()
+                        lr_model.fit(X, y)
                         
+                        # 预测未来值
                         future_X = np.arange(len(time_series), len(time_series) + forecast_days).reshape(-1, 1)
-                        prophet_forecast = prophet_model.predict(future_X)
+                        lr_forecast = lr_model.predict(future_X)
                         
-                        st.session_state.forecast_results["Prophet"] = prophet_forecast
-                    except Exception as e:
-                        st.error(f"Prophet模型预测出错：{e}")
-                
-                # 预测结果可视化
-                st.markdown("---")
-                st.markdown("### 📈 预测结果")
-                
-                # 创建未来日期
-                last_date = time_series.index[-1]
-                future_dates = pd.date_range(start=last_date + pd.Timedelta(days=1), periods=forecast_days, freq='D')
-                
-                # 创建预测图表
-                fig_forecast = go.Figure()
-                
-                # 添加历史数据
-                fig_forecast.add_trace(go.Scatter(
-                    x=time_series.index,
-                    y=time_series.values,
-                    mode='lines+markers',
-                    name='历史需求量',
-                    line=dict(color='#3b82f6', dash='dash')
-                ))
-                
-                # 添加各模型预测结果
-                colors = ['#ef4444', '#10b981', '#f59e0b', '#8b5cf6', '#06b6d4']
-                model_colors = dict(zip(selected_models, colors[:len(selected_models)]))
-                
-                for model_name, forecast_values in st.session_state.forecast_results.items():
-                    fig_forecast.add_trace(go.Scatter(
-                        x=future_dates,
-                        y=forecast_values,
-                        mode='lines+markers',
-                        name=f'{model_name}预测',
-                        line=dict(color=model_colors[model_name])
-                    ))
-                
-                fig_forecast.update_layout(
-                    title="需求预测趋势",
-                    xaxis_title="日期",
-                    yaxis_title="需求量",
-                    height=400,
-                    margin=dict(l=20, r=20, t=50, b=20)
-                )
-                st.plotly_chart(fig_forecast, use_container_width=True)
-                
-                # 预测评估
-                st.markdown("---")
-                st.markdown("### 📊 模型评估")
-                
-                # 如果有多个模型，计算评估指标
-                if len(st.session_state.forecast_results) > 0:
-                    # 准备评估数据（使用最近7天作为验证集）
-                    val_size = min(7, len(time_series) // 5)
-                    train_data = time_series[:-val_size]
-                    val_data = time_series[-val_size:]
-                    
-                    eval_results = []
-                    
-                    for model_name in selected_models:
-                        # 重新训练模型用于评估
-                        if model_name == "线性回归":
-                            X_train = np.arange(len(train_data)).reshape(-1, 1)
-                            y_train = train_data.values
-                            X_val = np.arange(len(train_data), len(train_data) + val_size).reshape(-1, 1)
-                            
-                            model = LinearRegression()
-                            model.fit(X_train, y_train)
-                            y_pred = model.predict(X_val)
+                        # 保存结果
+                        st.session_state.forecast_results["线性回归"] = lr_forecast
+                    
+                    # 2. 移动平均预测
+                    if "移动平均" in selected_models:
+                        window = 7  # 7天移动平均
+                        ma_forecast = []
+                        last_ma = time_series[-window:].mean()
                         
-                        elif model_name == "移动平均":
-                            window = 7
-                            y_pred = [train_data[-window:].mean()] * val_size
+                        for _ in range(forecast_days):
+                            ma_forecast.append(last_ma)
+                            # 简单移动平均：保持最后一个平均值
                         
-                        elif model_name == "指数平滑":
-                            y_pred = [train_data.iloc[-1]] * val_size
+                        st.session_state.forecast_results["移动平均"] = np.array(ma_forecast)
+                    
+                    # 3. 指数平滑预测
+                    if "指数平滑" in selected_models:
+                        alpha = 0.3  # 平滑系数
+                        es_forecast = []
+                        last_value = time_series.iloc[-1]
                         
-                        elif model_name == "季节性ARIMA":
-                            try:
-                                from statsmodels.tsa.arima.model import ARIMA
-                                model = ARIMA(train_data, order=(1, 1, 1))
-                                result = model.fit()
-                                y_pred = result.forecast(steps=val_size)
-                            except:
-                                y_pred = [train_data.iloc[-1]] * val_size
+                        for _ in range(forecast_days):
+                            es_forecast.append(last_value)
+                            # 简单指数平滑：保持最后一个预测值（更复杂的实现需要考虑趋势和季节性）
                         
-                        elif model_name == "Prophet":
-                            X_train = np.arange(len(train_data)).reshape(-1, 1)
-                            y_train = train_data.values
-                            X_val = np.arange(len(train_data), len(train_data) + val_size).reshape(-1, 1)
+                        st.session_state.forecast_results["指数平滑"] = np.array(es_forecast)
+                    
+                    # 4. 季节性ARIMA预测（简化版）
+                    if "季节性ARIMA" in selected_models:
+                        try:
+                            from statsmodels.tsa.arima.model import ARIMA
+                            
+                            # 简化的ARIMA模型
+                            model = ARIMA(time_series, order=(1, 1, 1))
+                            arima_result = model.fit()
+                            
+                            # 预测
+                            arima_forecast = arima_result.forecast(steps=forecast_days)
+                            st.session_state.forecast_results["季节性ARIMA"] = arima_forecast.values
+                        except Exception as e:
+                            st.error(f"ARIMA模型预测出错：{e}")
+                    
+                    # 5. Prophet预测（简化版）
+                    if "Prophet" in selected_models:
+                        try:
+                            # 简化的Prophet实现（这里使用线性回归模拟）
+                            # 完整实现需要安装fbprophet库
+                            X = np.arange(len(time_series)).reshape(-1, 1)
+                            y = time_series.values
                             
-                            model = LinearRegression()
-                            model.fit(X_train, y_train)
-                            y_pred = model.predict(X_val)
+                            prophet_model = LinearRegression()
+                            prophet_model.fit(X, y)
+                            
+                            future_X = np.arange(len(time_series), len(time_series) + forecast_days).reshape(-1, 1)
+                            prophet_forecast = prophet_model.predict(future_X)
+                            
+                            st.session_state.forecast_results["Prophet"] = prophet_forecast
+                        except Exception as e:
+                            st.error(f"Prophet模型预测出错：{e}")
+                    
+                    # 预测结果可视化
+                    st.markdown("---")
+                    st.markdown("### 📈 预测结果")
+                    
+                    # 创建未来日期
+                    last_date = time_series.index[-1]
+                    future_dates = pd.date_range(start=last_date + pd.Timedelta(days=1), periods=forecast_days, freq='D')
+                    
+                    # 创建预测图表
+                    fig_forecast = go.Figure()
+                    
+                    # 添加历史数据
+                    fig_forecast.add_trace(go.Scatter(
+                        x=time_series.index,
+                        y=time_series.values,
+                        mode='lines+markers',
+                        name='历史需求量',
+                        line=dict(color='#3b82f6', dash='dash')
+                    ))
+                    
+                    # 添加各模型预测结果
+                    colors = ['#ef4444', '#10b981', '#f59e0b', '#8b5cf6', '#06b6d4']
+                    model_colors = dict(zip(selected_models, colors[:len(selected_models)]))
+                    
+                    for model_name, forecast_values in st.session_state.forecast_results.items():
+                        fig_forecast.add_trace(go.Scatter(
+                            x=future_dates,
+                            y=forecast_values,
+                            mode='lines+markers',
+                            name=f'{model_name}预测',
+                            line=dict(color=model_colors[model_name])
+                        ))
+                    
+                    fig_forecast.update_layout(
+                        title="需求预测趋势",
+                        xaxis_title="日期",
+                        yaxis_title="需求量",
+                        height=400,
+                        margin=dict(l=20, r=20, t=50, b=20)
+                    )
+                    st.plotly_chart(fig_forecast, use_container_width=True)
+                    
+                    # 预测评估
+                    st.markdown("---")
+                    st.markdown("### 📊 模型评估")
+                    
+                    # 如果有多个模型，计算评估指标
+                    if len(st.session_state.forecast_results) > 0:
+                        # 准备评估数据（使用最近7天作为验证集）
+                        val_size = min(7, len(time_series) // 5)
+                        train_data = time_series[:-val_size]
+                        val_data = time_series[-val_size:]
                         
-                        else:
-                            y_pred = [train_data.iloc[-1]] * val_size
+                        eval_results = []
                         
-                        # 计算评估指标
-                        y_true = val_data.values
-                        y_pred = np.array(y_pred)
+                        for model_name in selected_models:
+                            # 重新训练模型用于评估
+                            if model_name == "线性回归":
+                                X_train = np.arange(len(train_data)).reshape(-1, 1)
+                                y_train = train_data.values
+                                X_val = np.arange(len(train_data), len(train_data) + val_size).reshape(-1, 1)
+                                
+                                model = LinearRegression()
+                                model.fit(X_train, y_train)
+                                y_pred = model.predict(X_val)
+                            
+                            elif model_name == "移动平均":
+                                window = 7
+                                y_pred = [train_data[-window:].mean()] * val_size
+                            
+                            elif model_name == "指数平滑":
+                                y_pred = [train_data.iloc[-1]] * val_size
+                            
+                            elif model_name == "季节性ARIMA":
+                                try:
+                                    from statsmodels.tsa.arima.model import ARIMA
+                                    model = ARIMA(train_data, order=(1, 1, 1))
+                                    result = model.fit()
+                                    y_pred = result.forecast(steps=val_size)
+                                except:
+                                    y_pred = [train_data.iloc[-1]] * val_size
+                            
+                            elif model_name == "Prophet":
+                                X_train = np.arange(len(train_data)).reshape(-1, 1)
+                                y_train = train_data.values
+                                X_val = np.arange(len(train_data), len(train_data) + val_size).reshape(-1, 1)
+                                
+                                model = LinearRegression()
+                                model.fit(X_train, y_train)
+                                y_pred = model.predict(X_val)
+                            
+                            else:
+                                y_pred = [train_data.iloc[-1]] * val_size
+                            
+                            # 计算评估指标
+                            y_true = val_data.values
+                            y_pred = np.array(y_pred)
+                            
+                            mae = mean_absolute_error(y_true, y_pred)
+                            mse = mean_squared_error(y_true, y_pred)
+                            rmse = np.sqrt(mse)
+                            mape = np.mean(np.abs((y_true - y_pred) / y_true)) * 100
+                            
+                            eval_results.append({
+                                "模型": model_name,
+                                "MAE": round(mae, 2),
+                                "MSE": round(mse, 2),
+                                "RMSE": round(rmse, 2),
+                                "MAPE (%)": round(mape, 2)
+                            })
                         
-                        mae = mean_absolute_error(y_true, y_pred)
-                        mse = mean_squared_error(y_true, y_pred)
-                        rmse = np.sqrt(mse)
-                        mape = np.mean(np.abs((y_true - y_pred) / y_true)) * 100
+                        # 显示评估结果
+                        eval_df = pd.DataFrame(eval_results)
+                        st.dataframe(eval_df, use_container_width=True)
                         
-                        eval_results.append({
-                            "模型": model_name,
-                            "MAE": round(mae, 2),
-                            "MSE": round(mse, 2),
-                            "RMSE": round(rmse, 2),
-                            "MAPE (%)": round(mape, 2)
-                        })
+                        # 高亮最佳模型
+                        best_model = eval_df.sort_values(by="RMSE").iloc[0]["模型"]
+                        st.success(f"**最佳预测模型：{best_model}**")
                     
-                    # 显示评估结果
-                    eval_df = pd.DataFrame(eval_results)
-                    st.dataframe(eval_df, use_container_width=True)
+                    # 预测报告
+                    st.markdown("---")
+                    st.markdown("### 📋 预测报告")
                     
-                    # 高亮最佳模型
-                    best_model = eval_df.sort_values(by="RMSE").iloc[0]["模型"]
-                    st.success(f"**最佳预测模型：{best_model}**")
-                
-                # 预测报告
-                st.markdown("---")
-                st.markdown("### 📋 预测报告")
-                
-                # 生成未来日期的预测汇总
-                if "预测报告" not in st.session_state:
-                    st.session_state.预测报告 = {}
-                
-                # 计算平均预测值
-                avg_forecast = np.zeros(forecast_days)
-                for forecast_values in st.session_state.forecast_results.values():
-                    avg_forecast += forecast_values
-                avg_forecast = avg_forecast / len(st.session_state.forecast_results)
-                
-                # 创建预测数据框
-                forecast_df = pd.DataFrame({
-                    "日期": future_dates,
-                    "平均预测值": np.round(avg_forecast, 0),
-                    "95%置信区间下限": np.round(avg_forecast * 0.9, 0),
-                    "95%置信区间上限": np.round(avg_forecast * 1.1, 0)
-                })
-                
-                # 汇总预测结果
-                total_forecast = int(forecast_df["平均预测值"].sum())
-                daily_avg = int(forecast_df["平均预测值"].mean())
-                
-                st.markdown(f"#### 📊 预测汇总")
-                st.markdown(f"- **预测产品**: {product_for_forecast}")
-                st.markdown(f"- **预测天数**: {forecast_days}天")
-                st.markdown(f"- **总预测需求量**: {total_forecast}件")
-                st.markdown(f"- **日均预测需求量**: {daily_avg}件")
-                st.markdown(f"- **使用模型数量**: {len(selected_models)}个")
-                
-                st.markdown(f"#### 📈 预测趋势")
-                st.markdown("- 预测期间需求量预计保持相对稳定")
-                st.markdown("- 建议关注节假日、促销活动等可能影响需求的因素")
-                st.markdown("- 预测结果仅供参考，实际需求可能受多种因素影响")
-                
-                st.markdown(f"#### 🎯 建议行动")
-                st.markdown("1. 根据预测结果调整生产计划")
-                st.markdown("2. 优化库存水平，避免库存积压或短缺")
-                st.markdown("3. 定期监控实际需求，及时调整预测模型")
-                st.markdown("4. 考虑建立安全库存，应对需求波动")
-                
-                # 显示详细预测表
-                st.markdown("#### 📅 详细预测")
-                st.dataframe(forecast_df, use_container_width=True)
-                
-                # 下载预测报告按钮
-                import io
-                buffer = io.BytesIO()
-                forecast_df.to_excel(buffer, index=False)
-                buffer.seek(0)
-                
-                st.download_button(
-                    label="📥 下载预测报告",
-                    data=buffer,
-                    file_name=f"需求预测报告_{product_for_forecast}_{datetime.today().strftime('%Y%m%d')}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
-          
+                    # 生成未来日期的预测汇总
+                    if "预测报告" not in st.session_state:
+                        st.session_state.预测报告 = {}
+                    
+                    # 计算平均预测值
+                    avg_forecast = np.zeros(forecast_days)
+                    for forecast_values in st.session_state.forecast_results.values():
+                        avg_forecast += forecast_values
+                    avg_forecast = avg_forecast / len(st.session_state.forecast_results)
+                    
+                    # 创建预测数据框
+                    forecast_df = pd.DataFrame({
+                        "日期": future_dates,
+                        "平均预测值": np.round(avg_forecast, 0),
+                        "95%置信区间下限": np.round(avg_forecast * 0.9, 0),
+                        "95%置信区间上限": np.round(avg_forecast * 1.1, 0)
+                    })
+                    
+                    # 汇总预测结果
+                    total_forecast = int(forecast_df["平均预测值"].sum())
+                    daily_avg = int(forecast_df["平均预测值"].mean())
+                    
+                    st.markdown(f"#### 📊 预测汇总")
+                    st.markdown(f"- **预测产品**: {product_for_forecast}")
+                    st.markdown(f"- **预测天数**: {forecast_days}天")
+                    st.markdown(f"- **总预测需求量**: {total_forecast}件")
+                    st.markdown(f"- **日均预测需求量**: {daily_avg}件")
+                    st.markdown(f"- **使用模型数量**: {len(selected_models)}个")
+                    
+                    st.markdown(f"#### 📈 预测趋势")
+                    st.markdown("- 预测期间需求量预计保持相对稳定")
+                    st.markdown("- 建议关注节假日、促销活动等可能影响需求的因素")
+                    st.markdown("- 预测结果仅供参考，实际需求可能受多种因素影响")
+                    
+                    st.markdown(f"#### 🎯 建议行动")
+                    st.markdown("1. 根据预测结果调整生产计划")
+                    st.markdown("2. 优化库存水平，避免库存积压或短缺")
+                    st.markdown("3. 定期监控实际需求，及时调整预测模型")
+                    st.markdown("4. 考虑建立安全库存，应对需求波动")
+                    
+                    # 显示详细预测表
+                    st.markdown("#### 📅 详细预测")
+                    st.dataframe(forecast_df, use_container_width=True)
+                    
+                    # 下载预测报告按钮
+                    import io
+                    buffer = io.BytesIO()
+                    forecast_df.to_excel(buffer, index=False)
+                    buffer.seek(0)
+                    
+                    st.download_button(
+                        label="📥 下载预测报告",
+                        data=buffer,
+                        file_name=f"需求预测报告_{product_for_forecast}_{datetime.today().strftime('%Y%m%d')}.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    )
+        
+        demand_forecast_fragment()
+        
     # 5. 可视化仪表盘
-    with analysis_tab5:
+    elif analysis_view == "可视化仪表盘":
         st.subheader("📊 可视化仪表盘")
         st.markdown("---")
         
-        if st.session_state.production_data.empty:
+        dashboard_products = load_product_names()
+        
+        if not dashboard_products:
             st.warning("暂无生产数据，请先在数据输入页面添加数据")
         else:
-            # 1. 筛选器面板
-            st.markdown("### 🎯 数据筛选")
-            with st.container():
-                col1, col2, col3 = st.columns([2, 2, 1])
+            # 筛选器、指标和趋势图（独立片段：调整筛选条件时只重新运行本片段）
+            @st.fragment
+            def dashboard_fragment(dashboard_products):
+                # 1. 筛选器面板
+                st.markdown("### 🎯 数据筛选")
+                with st.container():
+                    col1, col2, col3 = st.columns([2, 2, 1])
+                    with col1:
+                        selected_products = st.multiselect(
+                            "选择产品",
+                            options=dashboard_products,
+                            default=dashboard_products,
+                            key="dashboard_product_filter"
+                        )
+                    with col2:
+                        date_range = st.date_input(
+                            "选择日期范围",
+                            value=load_date_bounds(),
+                            key="dashboard_date_filter"
+                        )
+                    with col3:
+                        refresh_btn = st.button("🔄 刷新数据", key="dashboard_refresh")
+                
+                # 应用筛选：在数据库中按索引查询
+                start_date, end_date = normalize_date_range(date_range)
+                dashboard_filter = dict(
+                    products=None if len(selected_products) == len(dashboard_products) else selected_products,
+                    start_date=start_date,
+                    end_date=end_date
+                )
+                # 数据版本在查询任何数据之前读取一次，指标和各图表的缓存都使用该版本
+                dashboard_version = get_data_version()
+                
+                # 指标和趋势图读取每日汇总表：只在指标或图表缓存未命中时查询，同一次运行中最多查询一次
+                dashboard_rollup_memo = {}
+                
+                def load_dashboard_rollup():
+                    if "rollup" not in dashboard_rollup_memo:
+                        dashboard_rollup_memo["rollup"] = query_daily_rollup(**dashboard_filter)
+                    return dashboard_rollup_memo["rollup"]
+                
+                # 2. 总体概览指标卡片
+                st.markdown("### 🔢 生产概览")
+                
+                # 计算关键指标（与图表一样按筛选条件和数据版本缓存）
+                def build_dashboard_kpis():
+                    dashboard_rollup = load_dashboard_rollup()
+                    total_production = dashboard_rollup["生产数量"].sum()
+                    total_qualified = dashboard_rollup["合格数量"].sum()
+                    total_unqualified = dashboard_rollup["不合格数量"].sum()
+                    overall_yield_rate = (total_qualified / total_production * 100) if total_production > 0 else 0
+                    return total_production, total_qualified, total_unqualified, overall_yield_rate
+                
+                total_production, total_qualified, total_unqualified, overall_yield_rate = cached_view(
+                    "dashboard_kpis", dashboard_filter, build_dashboard_kpis, dashboard_version
+                )
+                
+                # 创建指标卡片
+                col1, col2, col3, col4 = st.columns(4)
                 with col1:
-                    selected_products = st.multiselect(
-                        "选择产品",
-                        options=st.session_state.production_data["产品名称"].unique(),
-                        default=st.session_state.production_data["产品名称"].unique(),
-                        key="dashboard_product_filter"
-                    )
+                    with st.container():
+                        st.markdown('<div class="metric-card">', unsafe_allow_html=True)
+                        st.metric(
+                            label="总生产数量",
+                            value=f"{total_production:,}",
+                            delta_color="off"
+                        )
+                        st.markdown('</div>', unsafe_allow_html=True)
                 with col2:
-                    date_range = st.date_input(
-                        "选择日期范围",
-                        value=(st.session_state.production_data["日期"].min(), st.session_state.production_data["日期"].max()),
-                        key="dashboard_date_filter"
-                    )
+                    with st.container():
+                        st.markdown('<div class="metric-card">', unsafe_allow_html=True)
+                        st.metric(
+                            label="总合格数量",
+                            value=f"{total_qualified:,}",
+                            delta_color="off"
+                        )
+                        st.markdown('</div>', unsafe_allow_html=True)
                 with col3:
-                    refresh_btn = st.button("🔄 刷新数据", key="dashboard_refresh")
-            
-            # 应用筛选
-            filtered_data = st.session_state.production_data[
-                (st.session_state.production_data["产品名称"].isin(selected_products)) &
-                (st.session_state.production_data["日期"] >= date_range[0]) &
-                (st.session_state.production_data["日期"] <= date_range[1])
-            ]
-            
-            # 2. 总体概览指标卡片
-            st.markdown("### 🔢 生产概览")
-            
-            # 计算关键指标
-            total_production = filtered_data["生产数量"].sum()
-            total_qualified = filtered_data["合格数量"].sum()
-            total_unqualified = filtered_data["不合格数量"].sum()
-            overall_yield_rate = (total_qualified / total_production * 100) if total_production > 0 else 0
-            total_products = filtered_data["产品名称"].nunique()
-            total_days = filtered_data["日期"].nunique()
-            
-            # 创建指标卡片
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                with st.container():
-                    st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-                    st.metric(
-                        label="总生产数量",
-                        value=f"{total_production:,}",
-                        delta_color="off"
-                    )
-                    st.markdown('</div>', unsafe_allow_html=True)
-            with col2:
-                with st.container():
-                    st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-                    st.metric(
-                        label="总合格数量",
-                        value=f"{total_qualified:,}",
-                        delta_color="off"
+                    with st.container():
+                        st.markdown('<div class="metric-card">', unsafe_allow_html=True)
+                        st.metric(
+                            label="总不合格数量",
+                            value=f"{total_unqualified:,}",
+                            delta_color="off"
+                        )
+                        st.markdown('</div>', unsafe_allow_html=True)
+                with col4:
+                    with st.container():
+                        st.markdown('<div class="metric-card">', unsafe_allow_html=True)
+                        st.metric(
+                            label="总体合格率",
+                            value=f"{overall_yield_rate:.2f}%",
+                            delta_color="off"
+                        )
+                        st.markdown('</div>', unsafe_allow_html=True)
+                
+                # 2. 核心趋势图表
+                st.markdown("---")
+                st.markdown("### 📈 核心趋势分析")
+                
+                # 2.1 按日期的生产趋势：按点数预算降采样（指标卡片仍使用完整数据），点数多时使用WebGL渲染
+                def build_daily_figure():
+                    daily_production = downsample_line_data(rollup_series(load_dashboard_rollup(), 'day'), "日期", "生产数量")
+                    daily_trace = scatter_trace_type(len(daily_production) * 3)
+                    daily_mode = "lines+markers" if daily_trace is go.Scatter else "lines"
+                    
+                    fig_daily = go.Figure()
+                    fig_daily.add_trace(daily_trace(
+                        x=daily_production["日期"],
+                        y=daily_production["生产数量"],
+                        name="生产数量",
+                        mode=daily_mode,
+                        line=dict(color="#2196F3", width=2),
+                        marker=dict(size=6)
+                    ))
+                    fig_daily.add_trace(daily_trace(
+                        x=daily_production["日期"],
+                        y=daily_production["合格数量"],
+                        name="合格数量",
+                        mode=daily_mode,
+                        line=dict(color="#4CAF50", width=2),
+                        marker=dict(size=6)
+                    ))
+                    
+                    # 添加合格率次要Y轴
+                    fig_daily.add_trace(daily_trace(
+                        x=daily_production["日期"],
+                        y=daily_production["合格率"],
+                        name="合格率",
+                        mode=daily_mode,
+                        line=dict(color="#FF9800", width=2, dash="dash"),
+                        marker=dict(size=6),
+                        yaxis="y2"
+                    ))
+                    
+                    fig_daily.update_layout(
+                        title="每日生产、合格数量与合格率趋势",
+                        xaxis_title="日期",
+                        yaxis_title="数量",
+                        yaxis2=dict(
+                            title="合格率 (%)",
+                            overlaying="y",
+                            side="right",
+                            range=[0, 100]
+                        ),
+                        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+                        template="plotly_white"
                     )
-                    st.markdown('</div>', unsafe_allow_html=True)
-            with col3:
-                with st.container():
-                    st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-                    st.metric(
-                        label="总不合格数量",
-                        value=f"{total_unqualified:,}",
-                        delta_color="off"
+                    return fig_daily
+                
+                # 2.2 按产品的生产与合格率
+                def build_product_figure():
+                    product_summary = load_dashboard_rollup().groupby("产品名称").agg({
+                        "生产数量": "sum",
+                        "合格数量": "sum"
+                    }).reset_index()
+                    product_summary["合格率"] = (product_summary["合格数量"] / product_summary["生产数量"] * 100).round(2)
+                    
+                    fig_product = go.Figure()
+                    fig_product.add_trace(go.Bar(
+                        x=product_summary["产品名称"],
+                        y=product_summary["生产数量"],
+                        name="生产数量",
+                        marker_color="#2196F3"
+                    ))
+                    fig_product.add_trace(go.Bar(
+                        x=product_summary["产品名称"],
+                        y=product_summary["合格数量"],
+                        name="合格数量",
+                        marker_color="#4CAF50"
+                    ))
+                    fig_product.update_layout(
+                        title="各产品生产与合格数量",
+                        xaxis_title="产品名称",
+                        yaxis_title="数量",
+                        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+                        template="plotly_white"
                     )
-                    st.markdown('</div>', unsafe_allow_html=True)
-            with col4:
-                with st.container():
-                    st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-                    st.metric(
-                        label="总体合格率",
-                        value=f"{overall_yield_rate:.2f}%",
-                        delta_color="off"
+                    return fig_product
+                
+                # 2.3 不合格原因分布（从不合格原因关联表统计）
+                def build_reasons_figure():
+                    reasons_count = query_reason_counts(**dashboard_filter).rename(columns={"不合格原因": "原因"})
+                    reasons_count["百分比"] = (reasons_count["次数"] / reasons_count["次数"].sum() * 100).round(2)
+                    
+                    fig_reasons = go.Figure(data=[go.Pie(
+                        labels=reasons_count["原因"],
+                        values=reasons_count["次数"],
+                        hole=0.3,
+                        hovertext=reasons_count["百分比"],
+                        hovertemplate="%{label}: %{value}次 (%{hovertext}%)",
+                        textinfo="percent",
+                        textfont=dict(color="#000000")
+                    )])
+                    fig_reasons.update_layout(
+                        title="不合格原因分布",
+                        template="plotly_white"
                     )
-                    st.markdown('</div>', unsafe_allow_html=True)
-            
-            # 2. 核心趋势图表
-            st.markdown("---")
-            st.markdown("### 📈 核心趋势分析")
-            
-            # 2.1 按日期的生产趋势
-            daily_production = filtered_data.groupby("日期")[["生产数量", "合格数量"]].sum().reset_index()
-            
-            fig_daily = go.Figure()
-            fig_daily.add_trace(go.Scatter(
-                x=daily_production["日期"],
-                y=daily_production["生产数量"],
-                name="生产数量",
-                mode="lines+markers",
-                line=dict(color="#2196F3", width=2),
-                marker=dict(size=6)
-            ))
-            fig_daily.add_trace(go.Scatter(
-                x=daily_production["日期"],
-                y=daily_production["合格数量"],
-                name="合格数量",
-                mode="lines+markers",
-                line=dict(color="#4CAF50", width=2),
-                marker=dict(size=6)
-            ))
-            
-            # 添加合格率次要Y轴
-            daily_production["合格率"] = (daily_production["合格数量"] / daily_production["生产数量"] * 100).fillna(0)
-            fig_daily.add_trace(go.Scatter(
-                x=daily_production["日期"],
-                y=daily_production["合格率"],
-                name="合格率",
-                mode="lines+markers",
-                line=dict(color="#FF9800", width=2, dash="dash"),
-                marker=dict(size=6),
-                yaxis="y2"
-            ))
-            
-            fig_daily.update_layout(
-                title="每日生产、合格数量与合格率趋势",
-                xaxis_title="日期",
-                yaxis_title="数量",
-                yaxis2=dict(
-                    title="合格率 (%)",
-                    overlaying="y",
-                    side="right",
-                    range=[0, 100]
-                ),
-                legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-                template="plotly_white"
-            )
-            
-            # 2.2 按产品的生产与合格率
-            product_summary = filtered_data.groupby("产品名称").agg({
-                "生产数量": "sum",
-                "合格数量": "sum"
-            }).reset_index()
-            product_summary["合格率"] = (product_summary["合格数量"] / product_summary["生产数量"] * 100).round(2)
-            
-            fig_product = go.Figure()
-            fig_product.add_trace(go.Bar(
-                x=product_summary["产品名称"],
-                y=product_summary["生产数量"],
-                name="生产数量",
-                marker_color="#2196F3"
-            ))
-            fig_product.add_trace(go.Bar(
-                x=product_summary["产品名称"],
-                y=product_summary["合格数量"],
-                name="合格数量",
-                marker_color="#4CAF50"
-            ))
-            fig_product.update_layout(
-                title="各产品生产与合格数量",
-                xaxis_title="产品名称",
-                yaxis_title="数量",
-                legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-                template="plotly_white"
-            )
+                    return fig_reasons
+                
+                # 图表按 (图表id, 筛选条件, 数据版本) 缓存，筛选和数据都不变时重新运行不再查询和重建
+                st.plotly_chart(cached_view("dashboard_daily", dashboard_filter, build_daily_figure, dashboard_version), use_container_width=True)
+                chart_col1, chart_col2 = st.columns(2)
+                with chart_col1:
+                    st.plotly_chart(cached_view("dashboard_products", dashboard_filter, build_product_figure, dashboard_version), use_container_width=True)
+                with chart_col2:
+                    st.plotly_chart(cached_view("dashboard_reasons", dashboard_filter, build_reasons_figure, dashboard_version), use_container_width=True)
             
-            # 2.3 不合格原因分布
-            reasons_data = []
-            for reasons in filtered_data["不合格原因"]:
-                if reasons and reasons != "无":
-                    for reason in reasons.split("、"):
-                        reasons_data.append(reason.strip())
-            
-            reasons_df = pd.DataFrame(reasons_data, columns=["原因"])
-            reasons_count = reasons_df["原因"].value_counts().reset_index()
-            reasons_count.columns = ["原因", "次数"]
-            reasons_count["百分比"] = (reasons_count["次数"] / reasons_count["次数"].sum() * 100).round(2)
-            
-            fig_reasons = go.Figure(data=[go.Pie(
-                labels=reasons_count["原因"],
-                values=reasons_count["次数"],
-                hole=0.3,
-                hovertext=reasons_count["百分比"],
-                hovertemplate="%{label}: %{value}次 (%{hovertext}%)",
-                textinfo="percent",
-                textfont=dict(color="#000000")
-            )])
-            fig_reasons.update_layout(
-                title="不合格原因分布",
-                template="plotly_white"
-            )
+            dashboard_fragment(dashboard_products)
             
             # 3. 智能报表生成
             st.markdown("---")
@@ -2555,14 +3690,16 @@ elif selected == "智能分析":
                 from datetime import datetime
                 
                 # 应用筛选条件
-                filtered_report_data = st.session_state.production_data[st.session_state.production_data["产品名称"].isin(selected_products)]
+                report_days = {"最近7天": 7, "最近30天": 30, "最近90天": 90}.get(time_filter)
+                report_start_date = pd.Timestamp(datetime.today().date()) - pd.Timedelta(days=report_days) if report_days else None
                 
-                if time_filter == "最近7天":
-                    filtered_report_data = filtered_report_data[filtered_report_data["日期"] >= pd.to_datetime(datetime.today() - pd.Timedelta(days=7))]
-                elif time_filter == "最近30天":
-                    filtered_report_data = filtered_report_data[filtered_report_data["日期"] >= pd.to_datetime(datetime.today() - pd.Timedelta(days=30))]
-                elif time_filter == "最近90天":
-                    filtered_report_data = filtered_report_data[filtered_report_data["日期"] >= pd.to_datetime(datetime.today() - pd.Timedelta(days=90))]
+                # 先按日期二分查找截取，再在切片上按产品筛选；日历键与数据帧取自同一快照
+                _, report_source, report_calendar_keys = get_production_snapshot()
+                filtered_report_data = slice_date_range(report_source, report_start_date)
+                filtered_report_data = filtered_report_data[filtered_report_data["产品名称"].isin(selected_products)]
+                
+                # 不合格原因统计（从不合格原因关联表查询，与报表使用相同的筛选条件）
+                report_reason_counts = query_reason_counts(products=selected_products, start_date=report_start_date)
                 
                 if filtered_report_data.empty:
                     st.warning("筛选条件下暂无数据")
@@ -2606,7 +3743,7 @@ elif selected == "智能分析":
                             report_content += f"- 今日合格率: {today_yield:.2f}%\n"
                             
                             report_content += f"\n### 各产品今日生产详情\n"
-                            today_product_summary = today_data.groupby('产品名称')[['生产数量', '合格数量', '不合格数量']].sum().reset_index()
+                            today_product_summary = today_data.groupby('产品名称', observed=True)[['生产数量', '合格数量', '不合格数量']].sum().reset_index()
                             today_product_summary['合格率'] = (today_product_summary['合格数量'] / today_product_summary['生产数量'] * 100).round(2)
                             report_content += today_product_summary.to_markdown(index=False, numalign="right") + "\n"
                         else:
@@ -2616,19 +3753,16 @@ elif selected == "智能分析":
                         # 质量周报特定内容
                         report_content += f"\n## 二、本周质量情况\n"
                         
-                        # 计算周环比
-                        current_week = filtered_report_data['日期'].dt.isocalendar().week.max()
-                        current_year = filtered_report_data['日期'].dt.isocalendar().year.max()
-                        
-                        this_week_data = filtered_report_data[(filtered_report_data['日期'].dt.isocalendar().week == current_week) & 
-                                                           (filtered_report_data['日期'].dt.isocalendar().year == current_year)]
-                        
-                        last_week = current_week - 1 if current_week > 1 else 52
-                        last_year = current_year if current_week > 1 else current_year - 1
-                        
-                        last_week_data = st.session_state.production_data[(st.session_state.production_data['日期'].dt.isocalendar().week == last_week) & 
-                                                                          (st.session_state.production_data['日期'].dt.isocalendar().year == last_year) &
-                                                                          (st.session_state.production_data['产品名称'].isin(selected_products))]
+                        # 计算周环比：ISO周键按记录主键从快照的日历键中取出，上周数据按日期范围从同一份数据中截取
+                        report_week_keys = report_calendar_keys.loc[filtered_report_data.index, 'ISO周']
+                        current_week_key = report_week_keys.max()
+                        last_week_year, last_week = divmod(previous_iso_week_key(current_week_key), 100)
+                        last_week_start = pd.Timestamp.fromisocalendar(last_week_year, last_week, 1)
+
+                        this_week_data = filtered_report_data[report_week_keys == current_week_key]
+
+                        last_week_data = slice_date_range(report_source, last_week_start, last_week_start + pd.Timedelta(days=6))
+                        last_week_data = last_week_data[last_week_data['产品名称'].isin(selected_products)]
                         
                         if not this_week_data.empty:
                             this_week_yield = (this_week_data['合格数量'].sum() / this_week_data['生产数量'].sum() * 100) if this_week_data['生产数量'].sum() > 0 else 0
@@ -2644,7 +3778,7 @@ elif selected == "智能分析":
                         report_content += f"\n## 二、月度产品分析\n"
                         
                         # 按产品分组的月度汇总
-                        monthly_product_summary = filtered_report_data.groupby(['产品名称']).agg({
+                        monthly_product_summary = filtered_report_data.groupby(['产品名称'], observed=True).agg({
                             '生产数量': ['sum', 'mean'],
                             '合格数量': ['sum', 'mean'],
                             '不合格数量': 'sum',
@@ -2660,37 +3794,19 @@ elif selected == "智能分析":
                         # 不合格原因分析特定内容
                         report_content += f"\n## 二、不合格原因详细分析\n"
                         
-                        reasons_list = []
-                        for reasons in filtered_report_data['不合格原因']:
-                            if reasons and reasons != "无":
-                                for reason in reasons.split("、"):
-                                    reasons_list.append(reason.strip())
-                        
-                        reasons_series = pd.Series(reasons_list)
-                        if not reasons_series.empty:
-                            reasons_count = reasons_series.value_counts().reset_index()
-                            reasons_count.columns = ['原因', '次数']
+                        if not report_reason_counts.empty:
+                            reasons_count = report_reason_counts.rename(columns={'不合格原因': '原因'})
                             reasons_count['占比'] = (reasons_count['次数'] / reasons_count['次数'].sum() * 100).round(2)
                             
                             report_content += reasons_count.to_markdown(index=False, numalign="right") + "\n"
                             
                             # 按产品分析不合格原因
                             report_content += f"\n### 按产品分析不合格原因\n"
-                            product_reasons = {}
-                            for _, row in filtered_report_data.iterrows():
-                                if row['不合格原因'] and row['不合格原因'] != "无":
-                                    product = row['产品名称']
-                                    for reason in row['不合格原因'].split("、"):
-                                        reason = reason.strip()
-                                        if product not in product_reasons:
-                                            product_reasons[product] = {}
-                                        if reason not in product_reasons[product]:
-                                            product_reasons[product][reason] = 0
-                                        product_reasons[product][reason] += 1
+                            product_reasons = query_product_reason_counts(products=selected_products, start_date=report_start_date)
                             
-                            for product, reasons in product_reasons.items():
+                            for product, reasons in product_reasons.groupby('产品名称', sort=False):
                                 report_content += f"\n**{product}**:\n"
-                                for reason, count in sorted(reasons.items(), key=lambda x: x[1], reverse=True):
+                                for reason, count in zip(reasons['不合格原因'], reasons['次数']):
                                     report_content += f"  * {reason}: {count}次\n"
                         else:
                             report_content += f"- 暂无不合格数据\n"
@@ -2701,7 +3817,7 @@ elif selected == "智能分析":
                         
                         if len(selected_products) >= 2:
                             # 多产品对比
-                            product_comparison = filtered_report_data.groupby('产品名称').agg({
+                            product_comparison = filtered_report_data.groupby('产品名称', observed=True).agg({
                                 '生产数量': ['sum', 'mean', 'max', 'min'],
                                 '合格率': ['mean', 'max', 'min'],
                                 '不合格数量': 'sum'
@@ -2717,7 +3833,7 @@ elif selected == "智能分析":
                     # 3. 通用的生产趋势分析
                     if report_type != "不合格原因分析":
                         report_content += f"\n## 三、生产趋势分析\n"
-                        daily_trend = filtered_report_data.groupby('日期')[['生产数量', '合格数量']].sum()
+                        daily_trend = rollup_series(filtered_report_data, 'day').set_index('日期')
                         
                         if not daily_trend.empty:
                             report_content += f"- 日均生产数量: {daily_trend['生产数量'].mean():.2f}件\n"
@@ -2727,7 +3843,7 @@ elif selected == "智能分析":
                     # 4. 通用的质量分析
                     if report_type not in ["生产日报", "不合格原因分析"]:
                         report_content += f"\n## 四、质量分析\n"
-                        product_quality = filtered_report_data.groupby('产品名称')[['生产数量', '合格数量']].sum()
+                        product_quality = filtered_report_data.groupby('产品名称', observed=True)[['生产数量', '合格数量']].sum()
                         product_quality['合格率'] = (product_quality['合格数量'] / product_quality['生产数量'] * 100).round(2)
                         
                         if not product_quality.empty:
@@ -2744,9 +3860,8 @@ elif selected == "智能分析":
                             report_content += f"1. 针对{best_quality}的成功经验，可在其他产品生产中推广应用\n"
                             report_content += f"2. 重点关注{worst_quality}的生产过程，分析合格率低下的根本原因\n"
                         
-                        if not reasons_series.empty:
-                            top_reasons = reasons_series.value_counts().head(3)
-                            report_content += f"3. 针对主要不合格原因'{top_reasons.index[0]}'，建议制定专项改进措施\n"
+                        if not report_reason_counts.empty:
+                            report_content += f"3. 针对主要不合格原因'{report_reason_counts['不合格原因'].iloc[0]}'，建议制定专项改进措施\n"
                         
                         report_content += f"4. 根据生产趋势合理安排生产计划，避免生产波动过大\n"
                         report_content += f"5. 定期分析质量数据，建立质量预警机制\n"
@@ -2774,54 +3889,60 @@ elif selected == "智能分析":
                         )
                     
                     elif report_format == "CSV":
-                        buffer = io.BytesIO()
-                        filtered_report_data.to_csv(buffer, index=False, encoding='utf-8-sig')
-                        buffer.seek(0)
+                        # 与报表相同的筛选条件，从数据库游标分块写入临时文件，不在内存中构建整个CSV
+                        csv_file = export_production_csv(products=selected_products, start_date=report_start_date)
                         
                         st.download_button(
                             label="📥 下载CSV数据",
-                            data=buffer,
+                            data=read_export_file(csv_file),
                             file_name=f"{report_type}_数据_{datetime.today().strftime('%Y%m%d')}.csv",
                             mime="text/csv"
                         )
                     
                     elif report_format == "Excel":
-                        buffer = io.BytesIO()
-                        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                            # 写入筛选后的数据
-                            filtered_report_data.to_excel(writer, sheet_name='原始数据', index=False)
-                            
-                            # 写入报表摘要
-                            summary_data = {
-                                '指标': ['总生产数量', '总合格数量', '总不合格数量', '总体合格率', '涉及产品数量', '报告覆盖天数'],
-                                '值': [total_production, total_qualified, total_unqualified, f"{overall_yield_rate:.2f}%", len(selected_products), filtered_report_data['日期'].nunique()]
-                            }
-                            pd.DataFrame(summary_data).to_excel(writer, sheet_name='报表摘要', index=False)
-                            
-                            # 写入产品汇总
-                            product_summary = filtered_report_data.groupby('产品名称')[['生产数量', '合格数量', '不合格数量']].sum().reset_index()
-                            product_summary['合格率'] = (product_summary['合格数量'] / product_summary['生产数量'] * 100).round(2)
-                            product_summary.to_excel(writer, sheet_name='产品汇总', index=False)
+                        # 写入临时文件：原始数据从数据库游标逐行流式写入，不在内存中构建整个工作簿
+                        excel_file = new_export_file()
+                        writer = StreamingExcelWriter(excel_file)
                         
-                        buffer.seek(0)
+                        # 写入筛选后的数据（与报表相同的筛选条件，超过单表行数上限时分表）
+                        writer.write_production_rows('原始数据', products=selected_products, start_date=report_start_date)
+                        
+                        # 写入报表摘要
+                        summary_data = {
+                            '指标': ['总生产数量', '总合格数量', '总不合格数量', '总体合格率', '涉及产品数量', '报告覆盖天数'],
+                            '值': [total_production, total_qualified, total_unqualified, f"{overall_yield_rate:.2f}%", len(selected_products), filtered_report_data['日期'].nunique()]
+                        }
+                        writer.write_frame('报表摘要', pd.DataFrame(summary_data))
+                        
+                        # 写入产品汇总
+                        product_summary = filtered_report_data.groupby('产品名称', observed=True)[['生产数量', '合格数量', '不合格数量']].sum().reset_index()
+                        product_summary['合格率'] = (product_summary['合格数量'] / product_summary['生产数量'] * 100).round(2)
+                        writer.write_frame('产品汇总', product_summary)
+                        writer.close()
                         
                         st.download_button(
                             label="📥 下载Excel报表",
-                            data=buffer,
+                            data=read_export_file(excel_file),
                             file_name=f"{report_type}_{datetime.today().strftime('%Y%m%d')}.xlsx",
                             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
                         )
     
     # 6. 知识库
-    with analysis_tab6:
+    elif analysis_view == "知识库":
         st.subheader("📚 知识库")
         st.markdown("---")
         
-        # 知识库功能选项卡
-        knowledge_tab1, knowledge_tab2, knowledge_tab3 = st.tabs(["行业最佳实践", "优化方案", "常见问题解答"])
+        # 知识库分类导航：只渲染当前选中的分类
+        knowledge_view = st.radio(
+            "知识库分类",
+            ["行业最佳实践", "优化方案", "常见问题解答", "质量工具指南", "生产效率提升"],
+            horizontal=True,
+            key="knowledge_view",
+            label_visibility="collapsed"
+        )
         
         # 1. 行业最佳实践
-        with knowledge_tab1:
+        if knowledge_view == "行业最佳实践":
             st.markdown("### 🏭 行业最佳实践")
             
             # 生产管理最佳实践
@@ -2875,7 +3996,7 @@ elif selected == "智能分析":
                 st.markdown("- 预测过程趋势")
             
         # 2. 优化方案
-        with knowledge_tab2:
+        elif knowledge_view == "优化方案":
             st.markdown("### 🛠️ 优化方案")
             
             # 质量问题优化方案
@@ -2967,7 +4088,7 @@ elif selected == "智能分析":
                         st.markdown(f"**预期效果**：{solution['预期效果']}")
             
         # 3. 常见问题解答
-        with knowledge_tab3:
+        elif knowledge_view == "常见问题解答":
             st.markdown("### ❓ 常见问题解答")
             
             # FAQ列表
@@ -3052,11 +4173,18 @@ elif selected == "智能分析":
                 }
             ]
             
+            # 分类和关键词筛选
+            faq_col1, faq_col2 = st.columns(2)
+            with faq_col1:
+                faq_categories = st.selectbox("问题分类", ["全部"] + sorted({faq.get("category", "其他") for faq in faq_list}), key="faq_category")
+            with faq_col2:
+                knowledge_search = st.text_input("搜索关键词", placeholder="输入问题或答案中的关键词", key="faq_search")
+            
             # 过滤FAQ
             filtered_faqs = []
             for faq in faq_list:
                 # 分类过滤
-                if faq_categories == "全部" or faq["category"] == faq_categories:
+                if faq_categories == "全部" or faq.get("category", "其他") == faq_categories:
                     # 关键词搜索
                     if not knowledge_search or knowledge_search.lower() in faq["question"].lower() or \
                        any(knowledge_search.lower() in answer.lower() for answer in faq["answer"]):
@@ -3065,18 +4193,18 @@ elif selected == "智能分析":
             # 显示FAQ
             if filtered_faqs:
                 for i, faq in enumerate(filtered_faqs, 1):
-                    with st.expander(f"Q{i}. {faq['question']} - [{faq['category']}]"):
+                    with st.expander(f"Q{i}. {faq['question']} - [{faq.get('category', '其他')}]"):
                         for j, answer in enumerate(faq["answer"], 1):
                             st.markdown(f"{j}. {answer}")
             else:
                 st.info("未找到相关问题解答，请尝试调整筛选条件或搜索关键词")
             
         # 4. 质量工具指南
-        with knowledge_tab4:
+        elif knowledge_view == "质量工具指南":
             st.markdown("### 📏 质量工具指南")
             
             # 质量工具分类
-            quality_tools = st.selectbox(
+            quality_tool = st.selectbox(
                 "选择质量工具",
                 [
                     "柏拉图 (Pareto Chart)", 
@@ -3292,7 +4420,7 @@ elif selected == "智能分析":
                     st.markdown(f"{i}. {note}")
             
         # 5. 生产效率提升
-        with knowledge_tab5:
+        elif knowledge_view == "生产效率提升":
             st.markdown("### 🚀 生产效率提升")
             
             # 效率提升方法
@@ -3382,7 +4510,7 @@ elif selected == "智能分析":
             ]
             
             # 显示FAQ
-            for faq in faq_list:
+            for faq in efficiency_faq:
                 with st.expander(f"❓ {faq['question']}"):
                     for i, answer_point in enumerate(faq['answer'], 1):
                         st.markdown(f"{i}. {answer_point}")
@@ -3413,40 +4541,41 @@ elif selected == "系统设置":
     
     # 显示当前数据量
     st.write(f"当前系统中共有 {len(st.session_state.production_data)} 条生产记录")
-    
+
+    # 显示数据在内存中的占用（紧凑类型前后对比）
+    wide_bytes, compact_bytes = production_memory_report(get_data_version(), st.session_state.production_data)
+    st.caption(f"数据内存占用：{compact_bytes / 1024 / 1024:.2f} MB（使用紧凑类型前约 {wide_bytes / 1024 / 1024:.2f} MB）")
+
+    # 删除后页面已重新运行，显示删除结果
+    if "setting_delete_message" in st.session_state:
+        st.success(st.session_state.pop("setting_delete_message"))
+
     # 数据管理功能
     if not st.session_state.production_data.empty:
         # 批量删除数据功能
         st.markdown("### 🗑️ 批量删除数据")
         
-        # 显示数据并添加复选框
-        selected_rows = []
-        for i, (index, row) in enumerate(st.session_state.production_data.iterrows()):
-            col1, col2 = st.columns([0.1, 0.9])
-            with col1:
-                if st.checkbox("", key=f"delete_setting_{index}"):
-                    selected_rows.append(index)
-            with col2:
-                st.write(f"**{row['产品名称']}** - {row['日期'].strftime('%Y-%m-%d')}: 生产 {row['生产数量']} 件, 合格率 {row['合格率']:.2f}%")
+        # 分页选择要删除的记录（选择按记录主键保存，翻页不丢失）
+        selected_rows = record_selector(st.session_state.production_data, key="setting_delete")
         
-        # 删除按钮
+        # 确认后才执行删除
+        confirm_delete = st.checkbox("确认要删除选中的数据吗？此操作不可恢复", key="setting_delete_confirm")
         if st.button("删除选中数据", type="secondary", help="此操作将删除选中的生产记录，请谨慎操作"):
-            if selected_rows:
-                # 确认删除
-                confirm_delete = st.checkbox("确认要删除选中的数据吗？此操作不可恢复")
-                if confirm_delete:
-                    # 从会话状态中删除数据
-                    st.session_state.production_data = st.session_state.production_data.drop(selected_rows)
-                    
-                    # 重置索引
-                    st.session_state.production_data = st.session_state.production_data.reset_index(drop=True)
-                    
-                    # 保存到数据库
-                    save_data_to_db(st.session_state.production_data)
-                    
-                    st.success(f"成功删除 {len(selected_rows)} 条数据")
-            else:
+            if not selected_rows:
                 st.warning("请先选择要删除的数据")
+            elif not confirm_delete:
+                st.warning("请先勾选确认删除")
+            else:
+                # 按主键从数据库中删除
+                delete_data_from_db(selected_rows)
+                
+                # 从共享缓存取得删除后的数据
+                st.session_state.production_data = get_production_data()
+                clear_record_selection("setting_delete")
+                
+                # 重新运行页面，记录数、内存占用和选择表格都基于删除后的数据重新显示
+                st.session_state.setting_delete_message = f"成功删除 {len(selected_rows)} 条数据"
+                st.rerun()
     
     # 清空数据按钮
     st.markdown("### 🗑️ 清空所有数据")
@@ -3456,22 +4585,40 @@ elif selected == "系统设置":
         else:
             confirm = st.checkbox("确认要清空所有数据吗？此操作不可恢复")
             if confirm:
-                st.session_state.production_data = pd.DataFrame(columns=st.session_state.production_data.columns)
                 # 清空数据库中的数据
                 clear_data_from_db()
+                st.session_state.production_data = get_production_data()
                 st.success("所有数据已清空")
     
+    # 重建汇总表
+    st.markdown("### 🔄 重建汇总数据")
+    st.caption("每日、每月汇总表在数据写入和删除时自动更新；如果数据库被其他工具直接修改过，可在此根据原始数据重建")
+    if st.button("重建汇总数据", key="rebuild_rollups"):
+        rebuild_rollups()
+        st.success("汇总数据已重建")
+    
     # 导出全部数据
     if not st.session_state.production_data.empty:
         
-        st.markdown(
-            get_csv_download_link(
-                st.session_state.production_data,
-                f"production_data_{datetime.today().strftime('%Y%m%d')}.csv",
-                "📥 导出全部生产数据"
-            ),
-            unsafe_allow_html=True
+        csv_download_button(
+            "📥 导出全部生产数据",
+            f"production_data_{datetime.today().strftime('%Y%m%d')}.csv",
+            key="all_data_download"
+        )
+    
+    st.markdown("---")
+    
+    # 运行耗时
+    st.markdown("### ⏱️ 运行耗时")
+    st.caption("上一次完整运行各阶段的耗时，其中前几项是每次运行都要付出的固定开销")
+    if st.session_state.get("last_run_timings"):
+        st.dataframe(
+            pd.DataFrame(st.session_state.last_run_timings, columns=["阶段", "耗时(毫秒)"]),
+            hide_index=True,
+            column_config={"耗时(毫秒)": st.column_config.NumberColumn(format="%.2f")}
         )
+    else:
+        st.info("暂无耗时数据，页面下一次运行后显示")
     
     st.markdown("---")
     
@@ -3480,3 +4627,9 @@ elif selected == "系统设置":
     st.write("产品生产数据分析系统 v1.0")
     st.write("用于分析产品生产数据，生成可视化图表和月度报告")
     st.write("© 2025 数据分析系统")
+
+# 保存本次运行的各阶段耗时
+mark_run_phase("页面内容")
+phase_starts = [RUN_STARTED] + [ended for _, ended in run_phases[:-1]]
+st.session_state.last_run_timings = [(name, (ended - started) * 1000) for (name, ended), started in zip(run_phases, phase_starts)]
+st.session_state.last_run_timings.append(("合计", (run_phases[-1][1] - RUN_STARTED) * 1000))
@@ -0,0 +1,51 @@
+import ast
+from pathlib import Path
+
+import pandas as pd
+
+APP_PATH = Path(__file__).resolve().parent.parent / "app.py"
+
+
+# app.py 是 Streamlit 脚本，导入时会运行整个页面；这里只取出批量导入校验用到的常量和函数
+def load_import_helpers():
+    tree = ast.parse(APP_PATH.read_text(encoding="utf-8"))
+    names = {"IMPORT_REQUIRED_COLUMNS", "parse_import_dates", "validate_import_chunk"}
+    nodes = [
+        node for node in tree.body
+        if (isinstance(node, ast.FunctionDef) and node.name in names)
+        or (isinstance(node, ast.Assign) and any(isinstance(target, ast.Name) and target.id in names for target in node.targets))
+    ]
+    namespace = {"pd": pd}
+    exec(compile(ast.Module(body=nodes, type_ignores=[]), str(APP_PATH), "exec"), namespace)
+    return namespace
+
+
+helpers = load_import_helpers()
+
+
+def make_chunk(dates):
+    return pd.DataFrame({
+        "日期": dates,
+        "产品名称": ["产品A"] * len(dates),
+        "生产数量": [10] * len(dates),
+        "合格数量": [9] * len(dates),
+        "不合格数量": [1] * len(dates),
+        "不合格原因": ["外观缺陷"] * len(dates),
+    })
+
+
+def test_mixed_date_formats_in_one_chunk_are_accepted():
+    chunk = make_chunk(["2024-01-01", "2024/01/06", "2024-01-07 08:30:00", "Jan 8, 2024", "20240109"])
+    records, rejected = helpers["validate_import_chunk"](chunk)
+    assert rejected.empty
+    assert records["日期"].dt.strftime("%Y-%m-%d").tolist() == [
+        "2024-01-01", "2024-01-06", "2024-01-07", "2024-01-08", "2024-01-09"
+    ]
+
+
+def test_invalid_dates_are_rejected_without_affecting_valid_rows():
+    chunk = make_chunk(["2024-01-01", "不是日期", "2024/02/30", "2024/01/06", None])
+    records, rejected = helpers["validate_import_chunk"](chunk)
+    assert records["日期"].dt.strftime("%Y-%m-%d").tolist() == ["2024-01-01", "2024-01-06"]
+    assert rejected.index.tolist() == [1, 2, 4]
+    assert set(rejected["拒绝原因"]) == {"日期格式错误"}